@@ -0,0 +1,162 @@
+"""!
+@file bench.py
+Measures how long the scheduler and the shared data classes take to do their
+jobs, so that changes to them can be compared against a baseline.
+
+This program runs either on the board or on a desktop computer under
+CPython, where the stand-in modules in @c host are used with the clock
+following real time. On the board, run it with @c mpremote @c run
+@c bench.py, or copy it over and call @c bench.run_all() after
+@c import @c bench; on the desktop, run @c python @c bench.py from
+@c src. The numbers from the two differ greatly, of course, but each can be
+compared with itself.
+"""
+
+try:
+    import pyb
+except ImportError:
+    import host
+    host.install(realtime=True)
+
+import gc
+import utime
+import cotask
+import task_share
+
+
+## The number of calls timed for each measurement
+CALLS = 2000
+
+
+def _idle_task():
+    """!
+    A task which does nothing but yield.
+    """
+    while True:
+        yield 0
+
+
+def _time_calls(fun, calls=CALLS):
+    """!
+    Times a number of calls to a function which takes no arguments.
+    @param fun The function to be called
+    @param calls The number of times to call it
+    @return The average time per call in microseconds
+    """
+    gc.collect()
+    start = utime.ticks_us()
+    for _ in range(calls):
+        fun()
+    return utime.ticks_diff(utime.ticks_us(), start) / calls
+
+
+def _make_task_list(n_tasks, n_levels, period):
+    """!
+    Creates a task list holding idle tasks spread across priority levels.
+    @param n_tasks The number of tasks
+    @param n_levels The number of different priorities to use
+    @param period The task period in milliseconds
+    @return The task list
+    """
+    task_list = cotask.TaskList()
+    for num in range(n_tasks):
+        task_list.append(cotask.Task(_idle_task, name='T' + str(num),
+                                     priority=num % n_levels, period=period))
+    return task_list
+
+
+def bench_schedulers(task_counts=(1, 2, 4, 8, 16), level_counts=(1, 4)):
+    """!
+    Measures each scheduler with various numbers of tasks and priority
+    levels. The idle cost is the time taken by a call when no task is due,
+    which is what the scheduler spends on every pass while waiting. The
+    dispatch rate is how many tasks per second can be run when every task is
+    always due, which shows the overhead of picking and running a task.
+    """
+    print('SCHEDULER       TASKS LEVELS  IDLE us/call  DISPATCH/s')
+    for name in ('pri_sched', 'rr_sched', 'deadline_sched', 'edf_sched'):
+        for n_levels in level_counts:
+            for n_tasks in task_counts:
+                if n_levels > n_tasks:
+                    continue
+                idle_list = _make_task_list(n_tasks, n_levels, 100000)
+                idle_us = _time_calls(getattr(idle_list, name))
+
+                busy_list = _make_task_list(n_tasks, n_levels, 0)
+                sched = getattr(busy_list, name)
+                utime.sleep_us(10)
+                start = utime.ticks_us()
+                runs = 0
+                for _ in range(CALLS):
+                    if name == 'rr_sched':
+                        sched()
+                        runs += n_tasks
+                    elif sched():
+                        runs += 1
+                elapsed = utime.ticks_diff(utime.ticks_us(), start)
+                print('{:<16s}{:5d}{:7d}{:14.2f}{:12.0f}'.format(
+                    name, n_tasks, n_levels, idle_us,
+                    runs * 1000000.0 / elapsed if elapsed > 0 else 0.0))
+
+
+def bench_task():
+    """!
+    Measures @c Task.schedule() for a task which is never due and one which
+    always is, with and without profiling.
+    """
+    print('TASK.SCHEDULE           us/call')
+    for profile in (False, True):
+        for period, label in ((100000, 'not due'), (0, 'due')):
+            task = cotask.Task(_idle_task, period=period, profile=profile)
+            utime.sleep_us(10)
+            print('{:<8s}{:<16s}{:7.2f}'.format(
+                label, 'profiled' if profile else '',
+                _time_calls(task.schedule)))
+
+
+def bench_shares(sizes=(10, 100, 1000)):
+    """!
+    Measures putting into and getting from queues of several sizes and a
+    share, with and without thread protection.
+    """
+    print('SHARE               SIZE PROTECT   PUT us   GET us')
+    for protect in (False, True):
+        for size in sizes:
+            queue = task_share.Queue('l', size, thread_protect=protect,
+                                     overwrite=True)
+            put_us = _time_calls(lambda: queue.put(1))
+
+            # Gets are timed in batches which each fill the queue then empty it
+            get_us = 0.0
+            done = 0
+            while done < CALLS:
+                queue.clear()
+                calls = min(size, CALLS - done)
+                for _ in range(calls):
+                    queue.put(1)
+                get_us += _time_calls(queue.get, calls) * calls
+                done += calls
+            get_us /= CALLS
+            print('{:<16s}{:8d}{:>8s}{:9.2f}{:9.2f}'.format(
+                'Queue', size, 'yes' if protect else 'no', put_us, get_us))
+
+        share = task_share.Share('l', thread_protect=protect)
+        print('{:<16s}{:>8s}{:>8s}{:9.2f}{:9.2f}'.format(
+            'Share', '-', 'yes' if protect else 'no',
+            _time_calls(lambda: share.put(1)), _time_calls(share.get)))
+        del task_share.share_list[:]
+
+
+def run_all():
+    """!
+    Runs all the benchmarks, printing a table for each.
+    """
+    bench_schedulers()
+    print('')
+    bench_task()
+    print('')
+    bench_shares()
+
+
+if __name__ == "__main__":
+    run_all()
@@ -28,11 +28,43 @@ ANY THEORY OF LIABILITY, WHETHER IN CONTRACT, STRICT LIABILITY, OR TORT
 SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 """
 
+import array                           # Compact arrays for histograms
 import gc                              # Memory allocation garbage collector
+import pyb                             # Used to wait for interrupts when idle
 import utime                           # Micropython version of time library
 import micropython                     # This shuts up incorrect warnings
 
 
+## Overrun policy under which a late task is run once for each period it has
+#  missed, back to back if need be, until it has caught up with its schedule
+CATCH_UP = 0
+
+## Overrun policy under which the runs a late task has missed are skipped;
+#  the task runs once and then keeps to its original schedule
+SKIP = 1
+
+## Overrun policy under which a late task runs once, then is rescheduled to
+#  run one period after the time at which it was found to be late
+REPHASE = 2
+
+## The number of bins in each of the run duration and lateness histograms kept
+#  by profiled tasks. The last bin counts everything which doesn't fit in the
+#  others
+HIST_BINS = 32
+
+## Reason given to a watchdog handler when a task has taken longer to run
+#  than its time budget
+OVER_BUDGET = 1
+
+## Reason given to a watchdog handler when a task has been running for longer
+#  than its time budget and hasn't yet yielded, as if it were stuck
+STUCK = 2
+
+## Reason given to a watchdog handler when a timed task has been waiting to
+#  run for longer than its time budget after it became due
+STARVED = 3
+
+
 class Task:
     """!
     Implements multitasking with scheduling and some performance logging.
@@ -70,7 +102,8 @@ class Task:
 
 
     def __init__(self, run_fun, name="NoName", priority=0, period=None,
-                 profile=False, trace=False, shares=()):
+                 profile=False, trace=False, shares=(), overrun=CATCH_UP,
+                 hist_width=100):
         """!
         Initialize a task object so it may be run by the scheduler.
 
@@ -90,8 +123,16 @@ class Task:
         @param profile Set to @c True to enable run-time profiling 
         @param trace Set to @c True to generate a list of transitions between
                states. @b Note: This slows things down and allocates memory.
+               Set to an integer @c N instead to keep only the most recent
+               @c N transitions in a ring buffer which is allocated once,
+               so tracing can be left on indefinitely; in that case the
+               task's states must be integers.
         @param shares A list or tuple of shares and queues used by this task.
                If no list is given, no shares are passed to the task
+        @param overrun What to do when a timed task falls a period or more
+               behind: @c CATCH_UP (the default), @c SKIP or @c REPHASE
+        @param hist_width The width in microseconds of each bin in the run
+               duration and lateness histograms kept when profiling
         """
         # The function which is run to implement this task's code. Since it 
         # is a generator, we "run" it here, which doesn't actually run it but
@@ -120,9 +161,24 @@ class Task:
             self.period = period
             self._next_run = None
 
+        ## The policy used when a timed task is a full period or more late,
+        #  one of @c CATCH_UP, @c SKIP or @c REPHASE
+        self.overrun = overrun
+
         # Flag which causes the task to be profiled, in which the execution
         #  time of the @c run() method is measured and basic statistics kept. 
         self._prof = profile
+
+        # Histograms of run durations and lateness, allocated once here so
+        # that profiling doesn't allocate memory as the task runs; a task
+        # which isn't profiled doesn't need them
+        self._hist_width = int(hist_width)
+        if profile:
+            self._dur_hist = array.array('L', [0] * HIST_BINS)
+            self._late_hist = array.array('L', [0] * HIST_BINS)
+        else:
+            self._dur_hist = None
+            self._late_hist = None
         self.reset_profile()
 
         # The previous state in which the task last ran. It is used to watch
@@ -131,14 +187,38 @@ class Task:
 
         # If transition tracing has been enabled, create an empty list in 
         # which to store transition (time, to-state) stamps
-        self._trace = trace
+        self._trace = bool(trace)
         self._tr_data = []
         self._prev_time = utime.ticks_us()
 
+        # If a ring buffer size was given, preallocate room for that many
+        # (time, to-state) pairs, stored alternately in one array. Times are
+        # the values of utime.ticks_us() at which the transitions occurred
+        if trace is not True and trace:
+            self._tr_ring = array.array('l', [0] * (2 * int(trace)))
+        else:
+            self._tr_ring = None
+        self._tr_idx = 0
+        self._tr_count = 0
+
         ## Flag which is set true when the task is ready to be run by the
         #  scheduler
         self.go_flag = False
 
+        # Items used by a Watchdog: whether this task is watched, its time
+        # budget in microseconds, when its current run began (None if it's
+        # not running) and how many runs have gone over the budget
+        self._watched = False
+        self._budget = 0
+        self._run_start = None
+        self._over_budget = 0
+
+        # True while the task has been suspended from its task list
+        self._suspended = False
+
+        # The task's position in its task list's deadline heap, if it's in one
+        self._heap_idx = -1
+
 
     def schedule(self) -> bool:
         """!
@@ -158,9 +238,19 @@ class Task:
             if self._prof:
                 stime = utime.ticks_us()
 
+            # If watched, note the start time so a stuck task can be caught
+            if self._watched:
+                self._run_start = utime.ticks_us()
+
             # Run the method belonging to the state which should be run next
             curr_state = next(self._run_gen)
 
+            if self._watched:
+                if utime.ticks_diff(utime.ticks_us(),
+                                    self._run_start) > self._budget:
+                    self._over_budget += 1
+                self._run_start = None
+
             # If profiling or tracing, save timing data
             if self._prof or self._trace:
                 etime = utime.ticks_us()
@@ -173,19 +263,36 @@ class Task:
                     self._run_sum += runt
                     if runt > self._slowest:
                         self._slowest = runt
+                    hbin = runt // self._hist_width
+                    if hbin >= HIST_BINS:
+                        hbin = HIST_BINS - 1
+                    self._dur_hist[hbin] += 1
 
             # If transition logic tracing is on, record a transition; if not,
-            # ignore the state. If out of memory, switch tracing off and 
-            # run the memory allocation garbage collector
+            # ignore the state. If out of memory, switch tracing off and
+            # run the memory allocation garbage collector. A ring buffer
+            # never needs more memory; it overwrites its oldest entries
             if self._trace:
-                try:
-                    if curr_state != self._prev_state:
-                        self._tr_data.append(
-                            (utime.ticks_diff(etime, self._prev_time),
-                             curr_state))
-                except MemoryError:
-                    self._trace = False
-                    gc.collect()
+                if curr_state != self._prev_state:
+                    if self._tr_ring is not None:
+                        ring = self._tr_ring
+                        idx = self._tr_idx
+                        ring[idx] = etime
+                        ring[idx + 1] = curr_state
+                        idx += 2
+                        if idx >= len(ring):
+                            idx = 0
+                        self._tr_idx = idx
+                        if self._tr_count < len(ring) // 2:
+                            self._tr_count += 1
+                    else:
+                        try:
+                            self._tr_data.append(
+                                (utime.ticks_diff(etime, self._prev_time),
+                                 curr_state))
+                        except MemoryError:
+                            self._trace = False
+                            gc.collect()
 
                 self._prev_state = curr_state
                 self._prev_time = etime
@@ -208,17 +315,39 @@ class Task:
         # If this task uses a timer, check if it's time to run run() again. If
         # so, set go flag and set the timer to go off at the next run time
         if self.period != None:
-            late = utime.ticks_diff(utime.ticks_us(), self._next_run)
+            now = utime.ticks_us()
+            late = utime.ticks_diff(now, self._next_run)
             if late > 0:
                 self.go_flag = True
-                self._next_run = utime.ticks_diff(self.period, 
-                                                  -self._next_run)
+                if late < self.period or self.period <= 0:
+                    self._next_run = utime.ticks_add(self._next_run,
+                                                     self.period)
+
+                # A full period or more late; the overrun policy decides
+                # whether to catch up, skip the missed runs, or start over
+                else:
+                    self._missed += 1
+                    if self.overrun == CATCH_UP:
+                        self._next_run = utime.ticks_add(self._next_run,
+                                                         self.period)
+                    else:
+                        missed = late // self.period
+                        self._skipped += missed
+                        if self.overrun == SKIP:
+                            self._next_run = utime.ticks_add(
+                                self._next_run, (missed + 1) * self.period)
+                        else:
+                            self._next_run = utime.ticks_add(now, self.period)
 
                 # If keeping a latency profile, record the data
                 if self._prof:
                     self._late_sum += late
                     if late > self._latest:
                         self._latest = late
+                    hbin = late // self._hist_width
+                    if hbin >= HIST_BINS:
+                        hbin = HIST_BINS - 1
+                    self._late_hist[hbin] += 1
 
         # If the task doesn't use a timer, we rely on go_flag to signal ready
         return self.go_flag
@@ -229,24 +358,81 @@ class Task:
         This method sets the period between runs of the task to the given
         number of milliseconds, or @c None if the task is triggered by calls
         to @c go() rather than time.
+        The time at which the task will next run isn't changed, unless the
+        task had no period, in which case it will first run one period from
+        now; to change the periods of several tasks together and restart
+        their schedules, use @c TaskList.set_period().
         @param new_period The new period in milliseconds between task runs
         """
         if new_period is None:
             self.period = None
         else:
-            self.period = int(new_period) * 1000
+            if self.period is None:
+                self._next_run = utime.ticks_add(utime.ticks_us(),
+                                                 int(new_period * 1000))
+            self.period = int(new_period * 1000)
 
 
     def reset_profile(self):
         """!
-        This method resets the variables used for execution time profiling.
-        This method is also used by @c __init__() to create the variables.
+        This method resets the variables used for execution time profiling
+        and the counts of missed and skipped runs. This method is also used by
+        @c __init__() to create the variables.
         """
+        self._missed = 0
+        self._skipped = 0
         self._runs = 0
         self._run_sum = 0
         self._slowest = 0
         self._late_sum = 0
         self._latest = 0
+        if self._prof:
+            for idx in range(HIST_BINS):
+                self._dur_hist[idx] = 0
+                self._late_hist[idx] = 0
+
+
+    def _percentile(self, hist, fraction, most):
+        """!
+        Estimate a percentile from one of the task's histograms.
+        @param hist The histogram, either @c _dur_hist or @c _late_hist
+        @param fraction The fraction of samples, such as 0.95, which should be
+               at or below the returned value
+        @param most The largest value recorded, which is returned if the
+               percentile lands in the last (overflow) bin
+        @return The upper edge, in microseconds, of the bin which holds the
+                percentile, or @c None if the histogram is empty or the task
+                isn't profiled
+        """
+        if hist is None:
+            return None
+        total = 0
+        for count in hist:
+            total += count
+        if total == 0:
+            return None
+
+        needed = fraction * total
+        so_far = 0
+        for idx in range(HIST_BINS - 1):
+            so_far += hist[idx]
+            if so_far >= needed:
+                return min((idx + 1) * self._hist_width, most)
+        return most
+
+
+    def get_percentiles(self):
+        """!
+        Get the 50th, 95th and 99th percentiles of the task's run duration
+        and lateness. Each is accurate to within one histogram bin width.
+        @return A tuple of two tuples, each holding the three percentiles in
+                microseconds: @c ((dur50, dur95, dur99), (late50, late95,
+                late99)). Values are @c None where no data has been taken
+        """
+        return (tuple(self._percentile(self._dur_hist, frac, self._slowest)
+                      for frac in (0.5, 0.95, 0.99)),
+                tuple(self._percentile(self._late_hist, frac, self._latest)
+                      for frac in (0.5, 0.95, 0.99)))
 
 
     def get_trace(self):
@@ -257,7 +443,25 @@ class Task:
         @return A possibly quite large string showing state transitions
         """
         tr_str = 'Task ' + self.name + ':'
-        if self._trace:
+        if self._tr_ring is not None:
+            tr_str += '\n'
+            ring = self._tr_ring
+            idx = (self._tr_idx - 2 * self._tr_count) % len(ring)
+            first_time = ring[idx]
+            last_state = None
+            for _ in range(self._tr_count):
+                tr_str += '{: 12.6f}: '.format(
+                    utime.ticks_diff(ring[idx], first_time) / 1000000.0)
+                if last_state is None:
+                    tr_str += '   -> {:d}\n'.format(ring[idx + 1])
+                else:
+                    tr_str += '{: 2d} -> {:d}\n'.format(last_state,
+                                                        ring[idx + 1])
+                last_state = ring[idx + 1]
+                idx += 2
+                if idx >= len(ring):
+                    idx = 0
+        elif self._trace:
             tr_str += '\n'
             last_state = 0
             total_time = 0.0
@@ -271,6 +475,33 @@ class Task:
         return tr_str
 
 
+    def dump_trace(self, stream):
+        """!
+        Write the contents of the task's trace ring buffer to a stream, such
+        as a UART, USB_VCP or file, as compact binary data.
+
+        Records are written oldest first. Each record is a pair of native
+        signed long integers (32 bits, little-endian on an STM32): the value
+        of @c utime.ticks_us() at the transition, then the state to which the
+        task moved. The data is written straight from the ring buffer, so no
+        copy of it is made. This only works if the task was created with an
+        integer @c trace parameter.
+        @param stream An object with a @c write() method which accepts
+               buffers, such as a @c pyb.UART or an open file
+        @return The number of records written
+        """
+        if self._tr_ring is None:
+            return 0
+
+        view = memoryview(self._tr_ring)
+        start = self._tr_idx - 2 * self._tr_count
+        if start < 0:
+            stream.write(view[start + len(view):])
+            start = 0
+        stream.write(view[start:self._tr_idx])
+        return self._tr_count
+
+
     def go(self):
         """!
         Method to set a flag so that this task indicates that it's ready to run.
@@ -299,6 +530,10 @@ class Task:
             rst += f"{avg_dur: 10.3f}{(self._slowest / 1000.0): 10.3f}"
             if self.period != None:
                 rst += f"{avg_late: 10.3f}{(self._latest / 1000.0): 10.3f}"
+        if self._missed or self._skipped:
+            rst += f"  missed {self._missed:d} skipped {self._skipped:d}"
+        if self._over_budget:
+            rst += f"  over budget {self._over_budget:d}"
         return rst
 
 
@@ -330,6 +565,34 @@ class TaskList:
         #  that priority. 
         self.pri_list = []
 
+        # The priority lists in pri_list, keyed by priority, so that the list
+        # for a task's priority can be found without searching
+        self._levels = {}
+
+        ## Tasks which have been suspended; they stay out of the lists used
+        #  for scheduling, costing nothing, until they are resumed
+        self.suspended = []
+
+        ## Timed tasks kept as a binary min-heap ordered by each task's next
+        #  run time, used by @c deadline_sched() so that only the task with
+        #  the earliest deadline has to be checked on each call
+        self.deadline_heap = []
+
+        # Tasks without a period, which only run after @c go() is called;
+        # these are kept sorted from highest to lowest priority
+        self._event_tasks = []
+
+        ## A @c Watchdog which @c run_until() checks on each pass, or @c None
+        self.watchdog = None
+
+        ## Total time in microseconds which @c run_until() has spent waiting
+        #  for tasks to become ready
+        self.idle_us = 0
+
+        ## Total time in microseconds which @c run_until() has spent running
+        #  the scheduler and tasks
+        self.busy_us = 0
+
 
     def append(self, task):
         """!
@@ -338,24 +601,235 @@ class TaskList:
         task which is ready to run at any given time. 
         @param task The task to be appended to the list
         """
-        # See if there's a tasklist with the given priority in the main list
+        self._insert_pri(task)
+        self._insert_timing(task)
+
+
+    def remove(self, task):
+        """!
+        Take a task out of the task list, whether it's active or suspended,
+        so that it will no longer be run.
+        @param task The task to be removed
+        """
+        if task._suspended:
+            self.suspended.remove(task)
+            task._suspended = False
+        else:
+            self._remove_pri(task)
+            self._remove_timing(task)
+
+
+    def suspend(self, task):
+        """!
+        Stop running a task until @c resume() is called. While it's
+        suspended, the task is kept out of the lists which the schedulers
+        look through, so it takes no time from them. Its generator is left
+        as it was and will continue from where it left off when resumed.
+        @param task The task to be suspended
+        """
+        if not task._suspended:
+            self._remove_pri(task)
+            self._remove_timing(task)
+            self.suspended.append(task)
+            task._suspended = True
+
+
+    def resume(self, task):
+        """!
+        Resume running a task which was suspended with @c suspend(). If the
+        task has a period, its schedule restarts now; it will run as soon as
+        the scheduler gets to it, then once each period after that.
+        @param task The task to be resumed
+        """
+        if task._suspended:
+            self.suspended.remove(task)
+            task._suspended = False
+            if task.period != None:
+                task._next_run = utime.ticks_us()
+            self._insert_pri(task)
+            self._insert_timing(task)
+
+
+    def _insert_pri(self, task):
+        """!
+        Put a task into the list of tasks at its priority, creating the list
+        for that priority if there isn't one yet.
+        @param task The task to be put into the priority list
+        """
+        # If a tasklist with this priority exists, add this task to it.
         new_pri = task.priority
-        for pri in self.pri_list:
-            # If a tasklist with this priority exists, add this task to it.
-            if pri[0] == new_pri:
-                pri.append(task)
-                break
+        pri = self._levels.get(new_pri)
+        if pri is not None:
+            pri.append(task)
+
+        # If the priority isn't in the list, start a new priority list with
+        # this task as first one. A priority list has the priority as element
+        # 0, an index into the list of tasks (used for round-robin scheduling
+        # those tasks) as the second item, and tasks after those. The main
+        # list is kept sorted from highest to lowest priority
+        else:
+            pri = [new_pri, 2, task]
+            self._levels[new_pri] = pri
+            idx = 0
+            while idx < len(self.pri_list) and self.pri_list[idx][0] > new_pri:
+                idx += 1
+            self.pri_list.insert(idx, pri)
+
+
+    def _remove_pri(self, task):
+        """!
+        Take a task out of the list of tasks at its priority, keeping the
+        round-robin index pointing at the task which was to run next, and
+        remove that priority's list if it's left empty. If the task's
+        priority was changed after it was put in, the other priority lists
+        are searched for it.
+        @param task The task to be removed from its priority list
+        """
+        pri = self._levels.get(task.priority)
+        if pri is None or task not in pri[2:]:
+            pri = None
+            for level in self.pri_list:
+                if task in level[2:]:
+                    pri = level
+                    break
+            if pri is None:
+                raise ValueError('Task ' + task.name + ' is not in this list')
+
+        idx = pri.index(task, 2)
+        del pri[idx]
+        if len(pri) <= 2:
+            del self._levels[pri[0]]
+            self.pri_list.remove(pri)
+        else:
+            if idx < pri[1]:
+                pri[1] -= 1
+            if pri[1] >= len(pri):
+                pri[1] = 2
+
+
+    def _insert_timing(self, task):
+        """!
+        Put a timed task into the deadline heap or an untimed task into the
+        list of tasks which wait for @c go().
+        @param task The task to be put in
+        """
+        if task.period != None:
+            self.deadline_heap.append(task)
+            self._sift_up(len(self.deadline_heap) - 1)
+        else:
+            # Insert after any tasks of the same or higher priority
+            events = self._event_tasks
+            idx = 0
+            while idx < len(events) and events[idx].priority >= task.priority:
+                idx += 1
+            events.insert(idx, task)
+
 
-        # If the priority isn't in the list, this else clause starts a new 
-        # priority list with this task as first one. A priority list has the
-        # priority as element 0, an index into the list of tasks (used for
-        # round-robin scheduling those tasks) as the second item, and tasks
-        # after those
+    def _remove_timing(self, task):
+        """!
+        Take a task out of the deadline heap or the list of untimed tasks,
+        whichever it's in. Where it is depends on its period when it was put
+        in, which may since have been changed with @c Task.set_period().
+        @param task The task to be taken out
+        """
+        heap = self.deadline_heap
+        idx = task._heap_idx
+        if 0 <= idx < len(heap) and heap[idx] is task:
+            last = heap.pop()
+            if idx < len(heap):
+                heap[idx] = last
+                last._heap_idx = idx
+                self._sift_up(idx)
+                self._sift_down(last._heap_idx)
+            task._heap_idx = -1
+        elif task in self._event_tasks:
+            self._event_tasks.remove(task)
         else:
-            self.pri_list.append([new_pri, 2, task])
+            raise ValueError('Task ' + task.name + ' is not in this list')
+
+
+    def set_period(self, tasks, new_period, stagger=False, offsets=None):
+        """!
+        Change the period of a group of tasks together and restart their
+        schedules from the same moment.
+
+        All the tasks are given the new period and their next run times are
+        computed from a single reading of the clock, so they stay in step
+        with one another. If the tasks are all due at the same instant, one
+        of them will always be late by the others' run times; setting
+        @c stagger spreads their start times evenly across the period to
+        avoid this, and @c offsets allows the start times to be chosen.
+        @param tasks A list or tuple of the tasks whose period is to change
+        @param new_period The new period in milliseconds, or @c None if the
+               tasks are to be triggered by @c go() rather than by time
+        @param stagger Set to @c True to space the tasks' start times evenly
+               through the period, in the order in which they're given
+        @param offsets A list or tuple holding, for each task, the delay in
+               milliseconds before it first runs; overrides @c stagger
+        """
+        now = utime.ticks_us()
+        for idx, task in enumerate(tasks):
+            if not task._suspended:
+                self._remove_timing(task)
+            task.set_period(new_period)
+            if task.period != None:
+                if offsets is not None:
+                    offset = int(offsets[idx] * 1000)
+                elif stagger:
+                    offset = task.period * idx // len(tasks)
+                else:
+                    offset = 0
+                task._next_run = utime.ticks_add(now, offset)
+            else:
+                task._next_run = None
+            if not task._suspended:
+                self._insert_timing(task)
+
+
+    @micropython.native
+    def _sift_up(self, idx):
+        """!
+        Move the task at position @c idx of the deadline heap toward the top
+        until its parent is due no later than it is.
+        @param idx The index in the heap of the task which is to be moved
+        """
+        heap = self.deadline_heap
+        task = heap[idx]
+        while idx > 0:
+            parent = (idx - 1) >> 1
+            if utime.ticks_diff(task._next_run, heap[parent]._next_run) >= 0:
+                break
+            heap[idx] = heap[parent]
+            heap[idx]._heap_idx = idx
+            idx = parent
+        heap[idx] = task
+        task._heap_idx = idx
 
-        # Make sure the main list (of lists at each priority) is sorted
-        self.pri_list.sort(key=lambda pri: pri[0], reverse=True)
+
+    @micropython.native
+    def _sift_down(self, idx):
+        """!
+        Move the task at position @c idx of the deadline heap toward the
+        bottom until neither of its children is due before it is.
+        @param idx The index in the heap of the task which is to be moved
+        """
+        heap = self.deadline_heap
+        length = len(heap)
+        task = heap[idx]
+        while True:
+            child = 2 * idx + 1
+            if child >= length:
+                break
+            if child + 1 < length and utime.ticks_diff(
+                    heap[child + 1]._next_run, heap[child]._next_run) < 0:
+                child += 1
+            if utime.ticks_diff(heap[child]._next_run, task._next_run) >= 0:
+                break
+            heap[idx] = heap[child]
+            heap[idx]._heap_idx = idx
+            idx = child
+        heap[idx] = task
+        task._heap_idx = idx
 
 
     @micropython.native
@@ -370,11 +844,15 @@ class TaskList:
         tasks are given a chance to run each time through the list, and it takes
         about the same amount of time before each is given a chance to run 
         again.
+        @return @c True if any task was run or @c False if none were ready
         """
         # For each priority level, run all tasks at that level
+        ran = False
         for pri in self.pri_list:
             for task in pri[2:]:
-                task.schedule()
+                if task.schedule():
+                    ran = True
+        return ran
 
 
     @micropython.native
@@ -385,6 +863,7 @@ class TaskList:
         This scheduler runs tasks in a priority based fashion. Each time it is
         called, it finds the highest priority task which is ready to run and
         calls that task's @c run() method.
+        @return @c True if a task was run or @c False if none were ready
         """
         # Go down the list of priorities, beginning with the highest
         for pri in self.pri_list:
@@ -400,7 +879,296 @@ class TaskList:
                 if pri[1] >= length:
                     pri[1] = 2
                 if ran:
-                    return
+                    return True
+        return False
+
+
+    @micropython.native
+    def deadline_sched(self):
+        """!
+        Run the timed task with the earliest deadline if it's due.
+
+        This scheduler keeps timed tasks in a heap sorted by the time at which
+        each is next due to run, so each call only has to check the clock
+        against the task at the top of the heap; the cost of a call doesn't
+        grow with the number of timed tasks. Tasks which have no period are
+        run when their @c go() method has been called; if such a task and a
+        due timed task are both ready, the one with higher priority runs,
+        with ties going to the timed task.
+
+        Because the heap is only reordered by this method, a given task list
+        should be run by @c deadline_sched() alone rather than alternating
+        with @c pri_sched() or @c rr_sched().
+        @return @c True if a task was run or @c False if none were ready
+        """
+        # Find the highest priority untimed task which has been told to go
+        event_task = None
+        for task in self._event_tasks:
+            if task.go_flag:
+                event_task = task
+                break
+
+        heap = self.deadline_heap
+        if heap:
+            task = heap[0]
+            if (utime.ticks_diff(utime.ticks_us(), task._next_run) > 0
+                    and (event_task is None
+                         or task.priority >= event_task.priority)):
+                task.schedule()
+
+                # Running the task has moved its next run time later
+                self._sift_down(0)
+                return True
+
+        if event_task is not None:
+            return event_task.schedule()
+
+        return False
+
+
+    @micropython.native
+    def edf_sched(self):
+        """!
+        Run the ready timed task whose deadline is soonest.
+
+        This earliest-deadline-first scheduler ignores the tasks' priorities.
+        Each timed task's deadline is taken to be the end of the period in
+        which it became ready, so among all the tasks which are due, the one
+        which must finish soonest is run. An EDF scheduler can keep all tasks
+        on time whenever the CPU isn't overloaded, which a fixed-priority
+        scheduler can't always do. Tasks without a period run, highest
+        priority first, only when no timed task is due.
+        @return @c True if a task was run or @c False if none were ready
+        """
+        now = utime.ticks_us()
+        best = None
+        best_deadline = 0
+        for task in self.deadline_heap:
+            if utime.ticks_diff(now, task._next_run) > 0:
+                deadline = utime.ticks_add(task._next_run, task.period)
+                if (best is None
+                        or utime.ticks_diff(deadline, best_deadline) < 0):
+                    best = task
+                    best_deadline = deadline
+
+        if best is not None:
+            return best.schedule()
+
+        for task in self._event_tasks:
+            if task.go_flag:
+                return task.schedule()
+
+        return False
+
+
+    def time_to_next(self):
+        """!
+        Find how long it will be until some task in the list is ready to run.
+
+        This method looks through all the timed tasks to find the earliest
+        next run time. It's meant to be called when the scheduler has found
+        nothing to do, so the time spent looking is time which would have
+        been spent idle anyway.
+        @return The time in microseconds until the next task is due, zero if
+                a task is ready now, or @c None if no tasks have periods
+        """
+        for task in self._event_tasks:
+            if task.go_flag:
+                return 0
+
+        now = utime.ticks_us()
+        wait = None
+        for task in self.deadline_heap:
+            if task.period != None:
+                until = utime.ticks_diff(task._next_run, now)
+                if wait is None or until < wait:
+                    wait = until
+        if wait is not None and wait < 0:
+            wait = 0
+        return wait
+
+
+    def run_for(self, duration, sched=None, use_wfi=False):
+        """!
+        Run the scheduler for the given number of milliseconds.
+
+        This is a convenience wrapper for @c run_until() which computes the
+        finishing time from the current time.
+        @param duration The time in milliseconds for which to run tasks
+        @param sched The scheduling method to use, by default @c pri_sched
+        @param use_wfi Set to @c True to wait for interrupts when idle
+        """
+        self.run_until(utime.ticks_add(utime.ticks_ms(), int(duration)),
+                       sched, use_wfi)
+
+
+    def run_until(self, end_ms, sched=None, use_wfi=False):
+        """!
+        Run the scheduler until the millisecond tick counter reaches the given
+        time, sleeping between task runs rather than polling.
+
+        Each time the scheduler finds no task ready to run, this method works
+        out how long it will be until the next task is due and sleeps until
+        then with @c utime.sleep_us(). If @c use_wfi is @c True, it instead
+        waits in @c pyb.wfi(), which wakes at the next interrupt (at most one
+        millisecond later, due to the system tick) so that tasks started by
+        @c go() from an interrupt service routine are run promptly. Time spent
+        waiting and time spent running is added to @c idle_us and @c busy_us;
+        see @c load(). If the task list has a @c watchdog, it is checked on
+        each pass.
+        @param end_ms The value of @c utime.ticks_ms() at which to stop
+        @param sched The scheduling method to use, by default @c pri_sched
+        @param use_wfi Set to @c True to wait for interrupts when idle
+        """
+        if sched is None:
+            sched = self.pri_sched
+
+        start = utime.ticks_us()
+        end = utime.ticks_add(start,
+                              utime.ticks_diff(end_ms, utime.ticks_ms()) * 1000)
+        idle = 0
+
+        while True:
+            if self.watchdog is not None:
+                self.watchdog.check()
+
+            left = utime.ticks_diff(end, utime.ticks_us())
+            if left <= 0:
+                break
+            if sched():
+                continue
+
+            # Nothing was ready, so wait until something will be
+            wait = self.time_to_next()
+            if wait is None or wait > left:
+                wait = left
+            if wait > 0:
+                idle_start = utime.ticks_us()
+                if use_wfi:
+                    pyb.wfi()
+                else:
+                    utime.sleep_us(wait)
+                idle += utime.ticks_diff(utime.ticks_us(), idle_start)
+
+        total = utime.ticks_diff(utime.ticks_us(), start)
+        self.idle_us += idle
+        self.busy_us += total - idle
+
+
+    def load(self):
+        """!
+        Compute the fraction of time for which the CPU has been busy while
+        being run by @c run_until() since the last call to @c reset_load().
+        @return The busy fraction, from 0.0 to 1.0, or @c None if the
+                scheduler hasn't been run
+        """
+        total = self.idle_us + self.busy_us
+        if total <= 0:
+            return None
+        return self.busy_us / total
+
+
+    def reset_load(self):
+        """!
+        Reset the idle and busy time totals kept by @c run_until().
+        """
+        self.idle_us = 0
+        self.busy_us = 0
+
+
+    def rm_priorities(self, base=1):
+        """!
+        Assign rate-monotonic priorities to the timed tasks in the list.
+
+        Tasks with shorter periods are given higher priorities, starting from
+        @c base for the task(s) with the longest period; tasks which have the
+        same period share a priority. Tasks without a period keep their own
+        priorities. The task list is then reorganized for @c pri_sched().
+        @param base The priority given to the timed tasks with longest period
+        """
+        periods = []
+        for task in self.deadline_heap:
+            if task.period not in periods:
+                periods.append(task.period)
+        periods.sort(reverse=True)
+        for task in self.deadline_heap:
+            task.priority = base + periods.index(task.period)
+
+        tasks = []
+        for pri in self.pri_list:
+            tasks.extend(pri[2:])
+        self.pri_list = []
+        self._levels = {}
+        for task in tasks:
+            self._insert_pri(task)
+
+
+    def schedulability(self, edf=False):
+        """!
+        Check whether the timed tasks can all meet their deadlines, based on
+        the worst-case run times measured while profiling them.
+
+        The CPU utilization is the sum over timed tasks of the slowest
+        measured run time divided by the period. For EDF scheduling, the
+        tasks are schedulable if utilization is at most 100% and no task's
+        period is shorter than its own run time plus the longest run time of
+        any other task, since a running task can't be preempted. For
+        fixed-priority scheduling, the worst-case response time of each task
+        is computed, counting as interference every task of equal or higher
+        priority and as blocking the slowest lower-priority task; each
+        response time must fit within the task's period.
+
+        The result is only as good as the profile data, so tasks should be
+        run with profiling on under realistic conditions before the check.
+        Tasks which haven't been profiled make the check fail.
+        @param edf Set to @c True to check for @c edf_sched(), @c False for
+               @c pri_sched()
+        @return A tuple holding @c True if the tasks are schedulable and a
+                string describing the analysis
+        """
+        tasks = [task for task in self.deadline_heap if task.period]
+        report = 'TASK             PRI    PERIOD   WCET   UTIL  RESPONSE\n'
+        util = 0.0
+        ok = True
+        for task in tasks:
+            if not task._prof or task._runs <= 2:
+                ok = False
+            util += task._slowest / task.period
+
+        for task in tasks:
+            wcet = task._slowest
+            others = [tsk for tsk in tasks if tsk is not task]
+            if edf:
+                blocking = max([tsk._slowest for tsk in others] or [0])
+                resp = wcet + blocking
+            else:
+                higher = [tsk for tsk in others
+                          if tsk.priority >= task.priority]
+                blocking = max([tsk._slowest for tsk in others
+                                if tsk.priority < task.priority] or [0])
+                resp = wcet + blocking
+                while resp <= task.period:
+                    new_resp = wcet + blocking
+                    for tsk in higher:
+                        new_resp += -(-resp // tsk.period) * tsk._slowest
+                    if new_resp == resp:
+                        break
+                    resp = new_resp
+            if resp > task.period:
+                ok = False
+            report += f"{task.name:<16s}{task.priority: 4d}" \
+                f"{(task.period / 1000.0): 10.1f}" \
+                f"{(wcet / 1000.0): 7.2f}" \
+                f"{(100.0 * wcet / task.period): 6.1f}%" \
+                f"{(resp / 1000.0): 10.2f}" \
+                + ('' if resp <= task.period else '  MISSES') + '\n'
+
+        if util > 1.0:
+            ok = False
+        report += 'Utilization {:.1f}%, {:s} {:s}\n'.format(
+            util * 100.0, 'EDF' if edf else 'fixed priority',
+            'schedulable' if ok else 'NOT schedulable')
+        return ok, report
 
 
     def __repr__(self):
@@ -412,10 +1180,177 @@ class TaskList:
         for pri in self.pri_list:
             for task in pri[2:]:
                 ret_str += str(task) + '\n'
+        for task in self.suspended:
+            ret_str += str(task) + '  (suspended)\n'
+
+        # Percentiles are shown for the tasks which are being profiled
+        pct_str = ''
+        for pri in self.pri_list:
+            for task in pri[2:]:
+                if task._prof and task._runs > 0:
+                    pct_str += f"{task.name:<16s}"
+                    for pcts in task.get_percentiles():
+                        for val in pcts:
+                            if val is None:
+                                pct_str += '         -'
+                            else:
+                                pct_str += f"{(val / 1000.0): 10.3f}"
+                    pct_str += '\n'
+        if pct_str:
+            ret_str += '\nTASK               DUR P50   DUR P95   DUR P99' \
+                '  LATE P50  LATE P95  LATE P99\n' + pct_str
+
+        load = self.load()
+        if load is not None:
+            ret_str += 'Busy {:.1f}%, idle {:.1f}% of {:.1f} ms\n'.format(
+                load * 100.0, (1.0 - load) * 100.0,
+                (self.idle_us + self.busy_us) / 1000.0)
 
         return ret_str
 
 
+class Watchdog:
+    """!
+    Watches tasks for running too long, getting stuck, or being starved of
+    CPU time, and calls a handler when something goes wrong.
+
+    Each watched task has a time budget. A violation occurs when the task
+    takes longer than its budget to run, when it has been running for longer
+    than its budget without yielding (as when a generator is spinning in a
+    loop waiting for a queue), or when it has been due to run for longer than
+    its budget without being run. The handler is called once when a task
+    begins violating its budget, with the task and the reason: one of
+    @c OVER_BUDGET, @c STUCK or @c STARVED. It is called again only after the
+    task has had a clean check. A typical handler turns the motors off.
+
+    The watchdog is checked by calling @c check(), which @c TaskList.run_until()
+    does on each pass if the watchdog is assigned to the task list's
+    @c watchdog attribute. Since a stuck task keeps the scheduler from
+    running, @c start() can be used to check from a timer interrupt as well;
+    the handlers must then be safe to call from an interrupt service routine.
+    If a hardware watchdog is given, it is fed only when all checks pass.
+
+    Example:
+      @code
+          def stop_motors (task, reason):
+              motor_0.set_duty_cycle (0)
+              motor_1.set_duty_cycle (0)
+
+          dog = cotask.Watchdog (stop_motors, wdt=machine.WDT (timeout=500))
+          dog.watch (m0Task, 5)          # 5 ms budget
+          dog.watch (m1Task, 5)
+          task_list.watchdog = dog
+          dog.start (7, 200)             # Also check 200 times a second
+      @endcode
+    """
+
+    def __init__(self, handler=None, wdt=None):
+        """!
+        Create a watchdog.
+        @param handler A function @c handler(task, reason) to be called when
+               a watched task which has no handler of its own violates its
+               budget, or @c None to only count violations
+        @param wdt A hardware watchdog such as @c machine.WDT, or anything
+               with a @c feed() method, or @c None
+        """
+        self.handler = handler
+        self.wdt = wdt
+
+        ## The number of times any task has begun violating its budget
+        self.violations = 0
+
+        # For each watched task, a list holding the task, its handler, its
+        # count of runs over budget when last checked and whether it was in
+        # violation when last checked
+        self._watched = []
+        self._timer = None
+
+
+    def watch(self, task, budget, handler=None):
+        """!
+        Start watching a task.
+        @param task The task to be watched
+        @param budget The task's time budget in milliseconds
+        @param handler A function @c handler(task, reason) to be called for
+               this task instead of the watchdog's own handler
+        """
+        task._budget = int(budget * 1000)
+        task._watched = True
+        self._watched.append([task, handler, task._over_budget, False])
+
+
+    @micropython.native
+    def check(self):
+        """!
+        Check each watched task, calling handlers for new violations and
+        feeding the hardware watchdog if there are none. This method doesn't
+        allocate memory, so it can be called from an interrupt.
+        @return @c True if all tasks are within their budgets
+        """
+        now = utime.ticks_us()
+        all_ok = True
+        for entry in self._watched:
+            task = entry[0]
+            reason = 0
+            if task._suspended:
+                pass
+            elif task._over_budget != entry[2]:
+                entry[2] = task._over_budget
+                reason = OVER_BUDGET
+            elif (task._run_start is not None and utime.ticks_diff(
+                    now, task._run_start) > task._budget):
+                reason = STUCK
+            elif (task.period != None and task._run_start is None
+                    and utime.ticks_diff(now, task._next_run) > task._budget):
+                reason = STARVED
+
+            if reason:
+                all_ok = False
+                if not entry[3]:
+                    entry[3] = True
+                    self.violations += 1
+                    handler = entry[1] if entry[1] is not None \
+                        else self.handler
+                    if handler is not None:
+                        handler(task, reason)
+            else:
+                entry[3] = False
+
+        if all_ok and self.wdt is not None:
+            self.wdt.feed()
+        return all_ok
+
+
+    def start(self, timer, freq):
+        """!
+        Check the watchdog from a timer interrupt as well as from the
+        scheduler, so that a task which never yields is still caught.
+        @param timer The number of a hardware timer to use
+        @param freq How many times per second to check
+        """
+        self._timer = pyb.Timer(timer, freq=freq)
+        self._timer.callback(self._check_isr)
+
+
+    def stop(self):
+        """!
+        Stop checking the watchdog from a timer interrupt.
+        """
+        if self._timer is not None:
+            self._timer.callback(None)
+            self._timer = None
+
+
+    def _check_isr(self, timer):
+        """!
+        Timer callback which checks the watchdog.
+        @param timer The timer which called back, which isn't used
+        """
+        self.check()
+
+
+# =============================================================================
+
 ## This is @b the main task list which is created for scheduling when 
 #  @c cotask.py is imported into a program. 
 task_list = TaskList()
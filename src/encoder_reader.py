@@ -1,24 +1,66 @@
 """!
-@file control.py
-Contains the EncoderReader class which is used to track the position of an
-encoder.
+@file encoder_reader.py
+Contains the EncoderReader class which is used to track the position and
+velocity of an encoder, and the EncoderBank class which reads several
+encoders at once.
 """
+import array
+import micropython
 import pyb
+import task_share
+import utime
 
 ENC_MAX = 0xFFFF
 
 
+@micropython.viper
+def _wrap_delta(cnt: int, last: int) -> int:
+    """!
+    Finds how far a 16-bit counter has moved since it was last read, taking
+    the shorter way around, so that a step across the wrap from 0xFFFF to 0
+    or back counts as a small step rather than nearly 65536 counts.
+    @param cnt The counter's new value
+    @param last The counter's value at the last read
+    @return The signed change in the count, from -32768 to 32767
+    """
+    return ((cnt - last + 0x8000) & 0xFFFF) - 0x8000
+
+
+@micropython.viper
+def _fold(count: int, delta: int) -> int:
+    """!
+    Adds a change to a position and folds the result into the range from
+    -2**29 to 2**29 - 1, which MicroPython holds as a small integer, so the
+    position never becomes a long integer allocated on the heap. Positions
+    wrap around like @c utime.ticks_ms() values, but only after more than
+    500 million counts.
+    @param count The position before the change
+    @param delta The change in position
+    @return The new position
+    """
+    return ((count + delta + 0x20000000) & 0x3FFFFFFF) - 0x20000000
+
+
 class EncoderReader:
-    count = 0
-    last_raw_cnt = 0
+    """!
+    Reads a quadrature encoder with a timer in encoder mode. The timer's
+    16-bit counter is read often enough that it can't move more than half
+    way around between reads, and each change is added to a position which
+    doesn't wrap at 16 bits.
+    """
 
-    def __init__(self, pin_a, pin_b, timer):
+    def __init__(self, pin_a, pin_b, timer, velocity=False, alpha=1.0):
         """!
         Creates an encoder reader on the passed pin names and
         timer number.
         @param pin_a The first input pin to be assigned by the encoder.
         @param pin_b The second input pin to be assigned by the encoder.
         @param timer The passed timer channel.
+        @param velocity If @c True, each read also estimates the velocity;
+               this costs a few floating point operations per read.
+        @param alpha The weight given to each new velocity estimate in a
+               first order low pass filter, from 1.0 (no filtering) down
+               toward 0.0 (heavy filtering).
         """
         # https://github.com/dhylands/upy-examples/blob/master/encoder2.py
         pa = pyb.Pin(pin_a, mode=pyb.Pin.IN)
@@ -28,27 +70,51 @@ class EncoderReader:
         self.ch_1 = self.tim.channel(1, pyb.Timer.ENC_AB, pin=pa)
         self.ch_2 = self.tim.channel(2, pyb.Timer.ENC_AB, pin=pb)
 
+        ## The position in encoder counts at the last read
+        self.count = 0
+
+        ## The estimated velocity in counts per second at the last read
+        self.velocity = 0.0
+
+        ## The time in microseconds, from @c utime.ticks_us(), of the last read
+        self.timestamp = utime.ticks_us()
+
+        self._last_raw_cnt = self.tim.counter()
+        self._track_velocity = velocity
+        self._alpha = alpha
+        self._sample_tim = None
+        self._queue = None
+
+    @micropython.native
     def read(self):
         """!
         Reads the encoder count on the passed encoder and allows
-        for under and overflow correction.
+        for under and overflow correction. If velocity tracking was asked
+        for, the velocity is estimated from the change in count and the
+        time since the last read and left in @c velocity.
+        @return The position in encoder counts
         """
-        # Previous count received from the encoder on the last read
-        cnt = self.tim.counter()
-        # Difference between the last read count (cnt) and the raw count
-        delta = cnt - self.last_raw_cnt
+        return self._update(self.tim.counter(), utime.ticks_us())
 
-        # Overflow max -> min
-
-        if delta > ENC_MAX // 2:
-            delta = ENC_MAX - delta
-
-        # Overflow min -> max
-        elif delta < -ENC_MAX // 2:
-            delta = -ENC_MAX - delta
+    @micropython.native
+    def _update(self, cnt, now):
+        """!
+        Updates the position, and the velocity if it's tracked, from a
+        reading of the timer's counter.
+        @param cnt The counter value which was read
+        @param now The time in microseconds at which it was read
+        @return The position in encoder counts
+        """
+        delta = _wrap_delta(cnt, self._last_raw_cnt)
+        self._last_raw_cnt = cnt
+        self.count = _fold(self.count, delta)
 
-        self.count += delta
-        self.last_raw_cnt = cnt
+        if self._track_velocity:
+            dt = utime.ticks_diff(now, self.timestamp)
+            if dt > 0:
+                raw = delta * 1000000.0 / dt
+                self.velocity += self._alpha * (raw - self.velocity)
+        self.timestamp = now
 
         return self.count
 
@@ -58,3 +124,148 @@ class EncoderReader:
         """
         self.count = 0
 
+    def start_sampling(self, timer, freq, queue):
+        """!
+        Reads the encoder from a timer interrupt at a fixed rate and puts
+        each position into a queue, so that the samples are evenly spaced no
+        matter when the task which uses them gets to run. The task can then
+        take the whole batch of samples from the queue, or just use
+        @c count, which always holds the latest one:
+        @code
+        samples = task_share.Queue('l', 100, thread_protect=True,
+                                   overwrite=True)
+        enc.start_sampling(5, 1000, samples)
+
+        # In the task
+        n = samples.get_many(batch)
+        @endcode
+        The task's reads must be protected from the interrupt, so the queue
+        must be either a @c task_share.Queue made with @c thread_protect=True
+        or a @c task_share.SPSCQueue, which needs no protection but can't
+        overwrite old samples; with it, samples are dropped if the task
+        falls behind.
+
+        While sampling, @c read() must not be called, as it would race with
+        the interrupt. Velocity tracking can't be used either, since it
+        needs floating point numbers, which can't be made in an interrupt.
+        @param timer The number of a hardware timer which is not otherwise
+               used
+        @param freq How many times per second to sample the encoder
+        @param queue A queue with type code @c 'l' or @c 'i' to receive the
+               positions; made with @c overwrite=True, it keeps the latest
+               samples if the task falls behind
+        """
+        if self._track_velocity:
+            raise ValueError('Velocity tracking cannot be used in an ISR')
+        if not isinstance(queue, task_share.Queue) or not (
+                queue._thread_protect
+                or isinstance(queue, task_share.SPSCQueue)):
+            raise ValueError('Sampling needs a thread protected Queue '
+                             'or an SPSCQueue')
+
+        # Let errors in the callback be reported instead of lost
+        micropython.alloc_emergency_exception_buf(100)
+
+        self._queue = queue
+        self._sample_tim = pyb.Timer(timer, freq=freq)
+        self._sample_tim.callback(self._sample_isr)
+
+    def stop_sampling(self):
+        """!
+        Stops reading the encoder from a timer interrupt.
+        """
+        if self._sample_tim is not None:
+            self._sample_tim.callback(None)
+            self._sample_tim = None
+
+    @micropython.native
+    def _sample_isr(self, timer):
+        """!
+        Timer callback which reads the encoder and queues its position.
+        @param timer The timer which called back, which isn't used
+        """
+        self._queue.put(self._update(self.tim.counter(), utime.ticks_us()),
+                        in_ISR=True)
+
+
+class EncoderBank:
+    """!
+    Reads several encoders at the same instant. All the timer counters are
+    read one right after another, then one time stamp is taken for them
+    all, and only then is the bookkeeping for each encoder done, so the
+    positions of all the axes are a coherent set and each added axis costs
+    little more than one counter read.
+    @code
+    bank = EncoderBank()
+    bank.add(EncoderReader(pyb.Pin.board.PB6, pyb.Pin.board.PB7, 4))
+    bank.add(EncoderReader(pyb.Pin.board.PC6, pyb.Pin.board.PC7, 8))
+
+    positions = bank.read()     # positions[0] and positions[1]
+    @endcode
+    """
+
+    def __init__(self, readers=()):
+        """!
+        Creates a bank of encoders.
+        @param readers The @c EncoderReader objects to be read together;
+               more can be added with @c add()
+        """
+        self._readers = []
+        self._counters = []
+
+        ## The positions of the encoders at the last read, in the order in
+        #  which they were added
+        self.positions = array.array('l')
+
+        ## The time in microseconds, from @c utime.ticks_us(), of the last read
+        self.timestamp = utime.ticks_us()
+
+        self._raw = array.array('l')
+        for reader in readers:
+            self.add(reader)
+
+    def add(self, reader):
+        """!
+        Adds an encoder to the bank. The arrays which hold the readings are
+        made again, so encoders should be added while setting up rather than
+        while the motors are running.
+        @param reader An @c EncoderReader
+        @return The index of the encoder's position in @c positions
+        """
+        self._readers.append(reader)
+        self._counters.append(reader.tim.counter)
+        count = len(self._readers)
+        self.positions = array.array('l', [each.count
+                                           for each in self._readers])
+        self._raw = array.array('l', [0] * count)
+        return count - 1
+
+    @micropython.native
+    def read(self):
+        """!
+        Reads all the encoders. Each @c EncoderReader is updated as if its
+        own @c read() had been called at the shared time stamp, so its
+        @c count and @c velocity stay current.
+        @return The array @c positions, which is reused by every read
+        """
+        raw = self._raw
+        counters = self._counters
+        count = len(counters)
+        for idx in range(count):
+            raw[idx] = counters[idx]()
+        now = utime.ticks_us()
+        self.timestamp = now
+
+        positions = self.positions
+        readers = self._readers
+        for idx in range(count):
+            positions[idx] = readers[idx]._update(raw[idx], now)
+        return positions
+
+    def zero(self):
+        """!
+        Resets the count of every encoder in the bank to zero.
+        """
+        for idx in range(len(self._readers)):
+            self._readers[idx].zero()
+            self.positions[idx] = 0
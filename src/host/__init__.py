@@ -0,0 +1,61 @@
+"""!
+@file host/__init__.py
+This package lets the MicroPython code in this project run unmodified under
+CPython on a desktop computer, faster than real time.
+
+It provides stand-ins for the @c pyb, @c utime, @c machine and
+@c micropython modules which are driven by a virtual microsecond clock. The
+clock only moves when code sleeps or when the simulation advances it, so a
+one second step response can be simulated in a few milliseconds. Timers keep
+their counters and PWM settings so that a simulated plant, such as the motor
+in @c host.plant, can connect a motor driver's output to an encoder's input.
+
+Example:
+  @code
+      import host
+      host.install()             # Must come before importing cotask, etc.
+
+      import cotask
+      import task_share
+      ...
+      host.clock.advance(1000)   # Let one millisecond go by
+  @endcode
+"""
+
+import sys
+
+from host.clock import Clock
+
+## This is @b the virtual clock used by all of the stand-in modules.
+clock = Clock()
+
+from host import utime, pyb, machine, micropython
+
+
+def install(realtime=False):
+    """!
+    Install the stand-in modules so that @c import @c pyb and the like will
+    find them. This must be called before the modules which use them are
+    imported.
+    @param realtime Set to @c True to have the clock follow the computer's
+           real time rather than virtual time; this is useful for measuring
+           how long code takes to run, as in @c bench.py
+    @return The clock which drives the stand-in modules
+    """
+    clock.realtime = realtime
+    sys.modules['utime'] = utime
+    sys.modules['pyb'] = pyb
+    sys.modules['machine'] = machine
+    sys.modules['micropython'] = micropython
+    return clock
+
+
+def reset():
+    """!
+    Put the simulated hardware back in its power-up state, setting the clock
+    to zero and forgetting all timers and anything attached to the clock.
+    This allows many independent simulations to be run one after another.
+    """
+    clock.reset()
+    pyb.Timer._timers.clear()
+    del pyb._pending_timers[:]
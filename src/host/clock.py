@@ -0,0 +1,135 @@
+"""!
+@file host/clock.py
+This file contains the virtual clock which drives the simulated hardware.
+"""
+
+import time
+
+
+class Clock:
+    """!
+    A microsecond clock which only moves when told to.
+
+    Code which reads the time sees the clock move forward by @c read_cost
+    microseconds at each reading, so that polling loops terminate and
+    profiled tasks have nonzero run times. Sleeping advances the clock by the
+    time slept. Objects which simulate hardware, such as timers with
+    callbacks and motor models, can be attached to the clock; they are
+    stepped each time the clock passes a multiple of @c max_step
+    microseconds since they were last stepped, whether it's moved by reading
+    it or by sleeping, and at the end of each sleep. Timer interrupts and
+    the motor therefore keep going while code busy-waits.
+    """
+
+    def __init__(self, read_cost=1, max_step=1000):
+        """!
+        Create a virtual clock which starts at zero.
+        @param read_cost Microseconds by which each reading of the time
+               advances the clock
+        @param max_step The longest time in microseconds for which attached
+               objects are stepped at once when the clock is advanced
+        """
+        ## The number of microseconds which each time reading takes
+        self.read_cost = read_cost
+
+        ## The longest slice of time by which attached objects are stepped
+        self.max_step = max_step
+
+        ## If @c True, the clock follows real time instead of virtual time
+        self.realtime = False
+
+        self.reset()
+
+
+    def reset(self):
+        """!
+        Set the clock back to zero and detach everything attached to it.
+        """
+        self._now = 0
+        self._stepped = 0
+        self._next_step = self.max_step
+        self._stepping = False
+        self._attached = []
+        self._real_start = time.perf_counter_ns()
+
+
+    def now(self):
+        """!
+        Read the clock, which advances it by @c read_cost microseconds.
+        @return The time in microseconds since the clock was reset
+        """
+        if self.realtime:
+            return (time.perf_counter_ns() - self._real_start) // 1000
+        self._now += self.read_cost
+        if self._now >= self._next_step and not self._stepping:
+            self._step_to(self._now)
+        return self._now
+
+
+    def advance(self, usec):
+        """!
+        Let the given number of microseconds go by, stepping each attached
+        object as time passes. In real time mode, this sleeps.
+        @param usec The number of microseconds by which to advance
+        """
+        if self.realtime:
+            if usec > 0:
+                time.sleep(usec / 1000000.0)
+            return
+
+        end = self._now + int(usec)
+        self._step_to(end)
+        if self._stepped < end:
+            self._step_all(end)
+
+
+    def _step_to(self, new_now):
+        """!
+        Move the clock to the given time, stepping the attached objects at
+        each multiple of @c max_step since they were last stepped.
+        @param new_now The time to which the clock moves
+        """
+        while new_now >= self._next_step:
+            self._step_all(self._next_step)
+        if self._now < new_now:
+            self._now = new_now
+
+
+    def _step_all(self, when):
+        """!
+        Step each attached object to the given time. Reading the clock from
+        inside a step, as a timer callback may, doesn't step anything again.
+        @param when The time to which the objects are stepped
+        """
+        self._stepped = when
+        self._next_step = when + self.max_step
+        if self._now < when:
+            self._now = when
+        if self._stepping:
+            return
+        self._stepping = True
+        try:
+            for thing in tuple(self._attached):
+                thing.step(when)
+        finally:
+            self._stepping = False
+
+
+    def attach(self, thing):
+        """!
+        Attach an object so that it's stepped as the clock advances. The
+        object must have a method @c step(now) which brings its simulated
+        state up to time @c now, in microseconds.
+        @param thing The object to be attached
+        """
+        if thing not in self._attached:
+            self._attached.append(thing)
+
+
+    def detach(self, thing):
+        """!
+        Detach an object which was attached with @c attach().
+        @param thing The object to be detached
+        """
+        if thing in self._attached:
+            self._attached.remove(thing)
@@ -0,0 +1,31 @@
+"""!
+@file host/machine.py
+A stand-in for the parts of MicroPython's @c machine module used here.
+"""
+
+import host
+
+
+class WDT:
+    """!
+    A watchdog timer which, rather than resetting anything, counts how many
+    times it has been fed and how many times it would have expired.
+    """
+
+    def __init__(self, id=0, timeout=5000):
+        """!
+        Create a watchdog which expires if not fed within @c timeout ms.
+        """
+        self.timeout = timeout
+        self.feeds = 0
+        self.expired = 0
+        self._last = host.clock.now()
+
+
+    def feed(self):
+        """! Feed the watchdog, noting if it would have expired already """
+        now = host.clock.now()
+        if now - self._last > self.timeout * 1000:
+            self.expired += 1
+        self._last = now
+        self.feeds += 1
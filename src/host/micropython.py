@@ -0,0 +1,34 @@
+"""!
+@file host/micropython.py
+A stand-in for the @c micropython module. The code emitters have no meaning
+under CPython, so their decorators return the function unchanged.
+"""
+
+
+def native(fun):
+    """! Return the function unchanged """
+    return fun
+
+
+def viper(fun):
+    """! Return the function unchanged """
+    return fun
+
+
+def const(value):
+    """! Return the value unchanged """
+    return value
+
+
+def alloc_emergency_exception_buf(size):
+    """! Do nothing, as CPython has no need of an emergency buffer """
+
+
+def schedule(fun, arg):
+    """! Run the function right away rather than soon """
+    fun(arg)
+
+
+def mem_info(verbose=False):
+    """! Print a line saying that memory information isn't available """
+    print('mem_info() not available on the host')
@@ -0,0 +1,92 @@
+"""!
+@file host/plant.py
+This file contains a simple model of a DC motor with a quadrature encoder,
+connected to the simulated timers used by @c MotorDriver and
+@c EncoderReader.
+"""
+
+import math
+
+import host
+from host import pyb
+
+
+class Motor:
+    """!
+    A first-order model of a motor and encoder.
+
+    The motor's speed approaches @c gain times the PWM duty cycle with time
+    constant @c tau. The encoder count is updated in the encoder timer's
+    counter, which wraps around at the timer's period as real hardware does.
+    The duty cycle is the difference between the percentages of channels 1
+    and 2 of the PWM timer, matching the way @c MotorDriver drives them.
+
+    The model is integrated exactly over each step, on the assumption that
+    the duty cycle doesn't change during a step. As the duty cycle is only
+    changed by tasks, which run between advances of the clock, the result
+    doesn't depend on the clock's @c max_step, which can then be made long
+    to run simulations quickly.
+    """
+
+    def __init__(self, pwm_timer, enc_timer, gain=1000.0, tau=0.05):
+        """!
+        Create a motor and attach it to the virtual clock.
+        @param pwm_timer The number of the timer driving the motor
+        @param enc_timer The number of the timer reading the encoder
+        @param gain The speed in encoder counts per second at 1% duty cycle
+        @param tau The mechanical time constant in seconds
+        """
+        self._pwm = pwm_timer
+        self._enc = enc_timer
+        self.gain = gain
+        self.tau = tau
+
+        ## The motor's speed in encoder counts per second
+        self.speed = 0.0
+
+        ## The motor's position in encoder counts, which doesn't wrap
+        self.position = 0.0
+
+        # Timers are looked up once; the dictionary of the PWM timer's
+        # channels is shared with the timer, so channels set up later by the
+        # motor driver are seen here
+        self._pwm_channels = pyb.Timer(self._pwm)._channels
+        self._enc_timer = pyb.Timer(self._enc)
+
+        self._last = host.clock._now
+        host.clock.attach(self)
+
+
+    def duty(self):
+        """!
+        Find the duty cycle which the motor driver is applying.
+        @return The signed duty cycle in percent
+        """
+        ch_1 = self._pwm_channels.get(1)
+        ch_2 = self._pwm_channels.get(2)
+        if ch_1 is None or ch_2 is None:
+            return 0.0
+        return ch_1.pulse_width_percent() - ch_2.pulse_width_percent()
+
+
+    def step(self, now):
+        """!
+        Bring the motor's speed and position up to the given time.
+        @param now The current time in microseconds
+        """
+        dt = (now - self._last) / 1000000.0
+        self._last = now
+        duty = self.duty()
+        if duty > 100.0:
+            duty = 100.0
+        elif duty < -100.0:
+            duty = -100.0
+
+        # The speed decays exponentially toward the steady state speed, and
+        # the position is the integral of that
+        target = self.gain * duty
+        decay = math.exp(-dt / self.tau)
+        self.position += target * dt \
+            + (self.speed - target) * self.tau * (1.0 - decay)
+        self.speed = target + (self.speed - target) * decay
+        self._enc_timer.counter(int(self.position))
@@ -0,0 +1,387 @@
+"""!
+@file host/pyb.py
+A stand-in for the parts of the @c pyb module used in this project.
+
+Timers remember their counters, callbacks and channel settings, so a
+simulated plant can read the PWM duty cycle set by a @c MotorDriver and set
+the count read by an @c EncoderReader. A timer which has a frequency and a
+callback calls the callback at that frequency as the virtual clock advances.
+"""
+
+import sys
+
+import host
+
+_irq_enabled = True
+
+# Timers whose period elapsed while interrupts were disabled; as on real
+# hardware, each one's interrupt is left pending and runs once interrupts
+# are enabled again
+_pending_timers = []
+
+
+def disable_irq():
+    """!
+    Disable interrupts, which here only keeps simulated timer callbacks from
+    running until @c enable_irq() is called.
+    @return The previous interrupt state, to be passed to @c enable_irq()
+    """
+    global _irq_enabled
+    state = _irq_enabled
+    _irq_enabled = False
+    return state
+
+
+def enable_irq(state=True):
+    """!
+    Restore the interrupt state saved by @c disable_irq(). If interrupts are
+    now enabled, the callbacks of timers which came due while they were
+    disabled are run.
+    @param state The state to restore
+    """
+    global _irq_enabled
+    _irq_enabled = state
+    while _irq_enabled and _pending_timers:
+        timer = _pending_timers.pop(0)
+        if timer._callback is not None:
+            timer._callback(timer)
+
+
+def wfi():
+    """!
+    Wait for an interrupt. The system tick interrupts every millisecond, so
+    this waits until the start of the next millisecond.
+    """
+    host.clock.advance(1000 - host.clock.now() % 1000)
+
+
+def millis():
+    """! @return The number of milliseconds since the clock was reset """
+    return host.clock.now() // 1000
+
+
+def micros():
+    """! @return The number of microseconds since the clock was reset """
+    return host.clock.now()
+
+
+def delay(msec):
+    """! Let the given number of milliseconds go by """
+    host.clock.advance(msec * 1000)
+
+
+def udelay(usec):
+    """! Let the given number of microseconds go by """
+    host.clock.advance(usec)
+
+
+def repl_uart(uart):
+    """! Do nothing; there's no REPL to move """
+
+
+def main(filename):
+    """! Do nothing; there's no boot sequence """
+
+
+# ============================================================================
+
+class _PinNames:
+    """!
+    A namespace such as @c Pin.board in which every attribute is the name of
+    the attribute, so @c Pin.board.PA10 is just @c 'PA10'.
+    """
+
+    def __getattr__(self, name):
+        return name
+
+
+class Pin:
+    """!
+    A GPIO pin which remembers its mode and the last value written to it.
+    """
+    IN = 0
+    OUT_PP = 1
+    OUT_OD = 17
+    AF_PP = 2
+    AF_OD = 18
+    ANALOG = 3
+    PULL_NONE = 0
+    PULL_UP = 1
+    PULL_DOWN = 2
+
+    ## Names of pins as labeled on the board
+    board = _PinNames()
+
+    ## Names of pins as labeled on the processor
+    cpu = _PinNames()
+
+    def __init__(self, name, mode=IN, pull=PULL_NONE, value=None, **kwargs):
+        """!
+        Create a pin.
+        @param name The name of the pin, or another pin to copy the name of
+        @param mode The pin mode, such as @c Pin.IN or @c Pin.OUT_PP
+        @param pull The pull-up or pull-down setting
+        @param value An initial output value
+        """
+        self._name = name._name if isinstance(name, Pin) else str(name)
+        self._mode = mode
+        self._value = 0 if value is None else int(bool(value))
+
+
+    def value(self, new_value=None):
+        """!
+        Read or write the pin's value.
+        @param new_value The value to write, or @c None to read
+        @return The pin's value if reading
+        """
+        if new_value is None:
+            return self._value
+        self._value = int(bool(new_value))
+
+
+    def high(self):
+        """! Set the pin high """
+        self._value = 1
+
+
+    def low(self):
+        """! Set the pin low """
+        self._value = 0
+
+
+    def name(self):
+        """! @return The pin's name """
+        return self._name
+
+
+    def __call__(self, new_value=None):
+        return self.value(new_value)
+
+
+    def __repr__(self):
+        return 'Pin({:s})'.format(self._name)
+
+
+# ============================================================================
+
+class TimerChannel:
+    """!
+    One channel of a timer, which remembers its mode and PWM setting.
+    """
+
+    def __init__(self, timer, number, mode, pin=None, **kwargs):
+        self._timer = timer
+        self._number = number
+        self._mode = mode
+        self._pin = pin
+        self._percent = 0
+        self._callback = None
+
+
+    def pulse_width_percent(self, value=None):
+        """!
+        Read or set the PWM duty cycle in percent.
+        @param value The new duty cycle, or @c None to read it
+        @return The duty cycle if reading
+        """
+        if value is None:
+            return self._percent
+        self._percent = value
+
+
+    def pulse_width(self, value=None):
+        """!
+        Read or set the pulse width in timer counts.
+        """
+        if value is None:
+            return self._percent * (self._timer._period + 1) / 100.0
+        self._percent = value * 100.0 / (self._timer._period + 1)
+
+
+    def callback(self, fun):
+        """! Set a function to be called on channel events; never called """
+        self._callback = fun
+
+
+class Timer:
+    """!
+    A hardware timer. Creating a timer with a number which has been used
+    before gives back the same timer, as on a pyboard, so that simulated
+    hardware can find the timers which the program under test has set up.
+    """
+    UP = 0
+    DOWN = 1
+    CENTER = 2
+    PWM = 0
+    PWM_INVERTED = 1
+    OC_TIMING = 2
+    OC_ACTIVE = 3
+    OC_INACTIVE = 4
+    OC_TOGGLE = 5
+    OC_FORCED_ACTIVE = 6
+    OC_FORCED_INACTIVE = 7
+    IC = 8
+    ENC_A = 9
+    ENC_B = 10
+    ENC_AB = 11
+    HIGH = 0
+    LOW = 2
+    RISING = 0
+    FALLING = 2
+    BOTH = 10
+
+    # The timers which have been created, keyed by timer number
+    _timers = {}
+
+    def __new__(cls, number, **kwargs):
+        timer = cls._timers.get(number)
+        if timer is None:
+            timer = super().__new__(cls)
+            timer._number = number
+            timer._counter = 0
+            timer._period = 0xFFFF
+            timer._freq = None
+            timer._callback = None
+            timer._channels = {}
+            timer._last = 0
+            cls._timers[number] = timer
+        return timer
+
+
+    def __init__(self, number, **kwargs):
+        """!
+        Create or find a timer and, if any settings are given, initialize it.
+        @param number The timer number
+        """
+        if kwargs:
+            self.init(**kwargs)
+
+
+    def init(self, freq=None, prescaler=None, period=None, callback=None,
+             **kwargs):
+        """!
+        Initialize the timer with either a frequency or a prescaler and
+        period, and optionally a callback.
+        """
+        if period is not None:
+            self._period = period
+        if freq is not None:
+            self._freq = freq
+        elif prescaler is not None:
+            self._freq = 84000000 / (prescaler + 1) / (self._period + 1)
+        self._counter = 0
+        self.callback(callback)
+
+
+    def deinit(self):
+        """! Stop the timer and its callback """
+        self.callback(None)
+        self._freq = None
+
+
+    def counter(self, value=None):
+        """!
+        Read or set the timer's counter.
+        @param value The new counter value, or @c None to read it
+        @return The counter value if reading
+        """
+        if value is None:
+            return self._counter
+        self._counter = int(value) & self._period
+
+
+    def period(self, value=None):
+        """! Read or set the timer's period (its counter's maximum value) """
+        if value is None:
+            return self._period
+        self._period = value
+
+
+    def freq(self, value=None):
+        """! Read or set the timer's frequency """
+        if value is None:
+            return self._freq
+        self._freq = value
+
+
+    def channel(self, number, mode=None, pin=None, **kwargs):
+        """!
+        Get a timer channel, or set it up if a mode is given.
+        @param number The channel number
+        @param mode The channel mode, such as @c Timer.PWM or @c Timer.ENC_AB
+        @param pin The pin the channel drives or reads
+        @return The channel
+        """
+        if mode is None:
+            return self._channels.get(number)
+        chan = TimerChannel(self, number, mode, pin, **kwargs)
+        self._channels[number] = chan
+        return chan
+
+
+    def callback(self, fun):
+        """!
+        Set a function to be called each time the timer's period elapses,
+        with the timer as its argument; @c None stops the callbacks.
+        @param fun The callback function or @c None
+        """
+        self._callback = fun
+        if fun is None:
+            host.clock.detach(self)
+        else:
+            self._last = host.clock._now
+            host.clock.attach(self)
+
+
+    def step(self, now):
+        """!
+        Call the callback once for each period which has elapsed since the
+        last step; called as the virtual clock advances. While interrupts
+        are disabled, the interrupt is left pending instead, and however
+        many periods elapse, the callback runs once when they're enabled.
+        @param now The current time in microseconds
+        """
+        if not self._freq or self._callback is None:
+            self._last = now
+            return
+        interval = 1000000.0 / self._freq
+        while now - self._last >= interval:
+            self._last += interval
+            if _irq_enabled:
+                self._callback(self)
+            elif self not in _pending_timers:
+                _pending_timers.append(self)
+
+
+# ============================================================================
+
+class USB_VCP:
+    """!
+    The USB virtual serial port, which writes to standard output.
+    """
+
+    def __init__(self, id=0):
+        pass
+
+
+    def write(self, buf):
+        """!
+        Write bytes to standard output.
+        @return The number of bytes written
+        """
+        sys.stdout.buffer.write(bytes(buf))
+        return len(buf)
+
+
+    def any(self):
+        """! @return @c False, since nothing is ever received """
+        return False
+
+
+class UART(USB_VCP):
+    """!
+    A serial port which, like the USB port, writes to standard output.
+    """
+
+    def __init__(self, id, baudrate=115200, **kwargs):
+        pass
@@ -0,0 +1,67 @@
+"""!
+@file host/utime.py
+A stand-in for MicroPython's @c utime module, driven by the virtual clock.
+
+The tick counters wrap around at 2**30 as they do on a pyboard, so code which
+doesn't use @c ticks_diff() and @c ticks_add() properly will fail here too.
+"""
+
+import host
+
+## The value at which the tick counters wrap around
+TICKS_PERIOD = 1 << 30
+
+_TICKS_MAX = TICKS_PERIOD - 1
+_TICKS_HALF = TICKS_PERIOD // 2
+
+
+def ticks_us():
+    """! @return The microsecond tick count """
+    return host.clock.now() & _TICKS_MAX
+
+
+def ticks_ms():
+    """! @return The millisecond tick count """
+    return (host.clock.now() // 1000) & _TICKS_MAX
+
+
+def ticks_cpu():
+    """! @return The finest available tick count, here microseconds """
+    return ticks_us()
+
+
+def ticks_diff(ticks1, ticks2):
+    """!
+    Compute the signed difference between two tick counts, allowing for
+    wraparound.
+    @return @c ticks1 - @c ticks2
+    """
+    return ((ticks1 - ticks2 + _TICKS_HALF) & _TICKS_MAX) - _TICKS_HALF
+
+
+def ticks_add(ticks, delta):
+    """!
+    Add a possibly negative delta to a tick count, allowing for wraparound.
+    @return The tick count @c delta ticks after @c ticks
+    """
+    return (ticks + delta) & _TICKS_MAX
+
+
+def sleep_us(usec):
+    """! Let the given number of microseconds go by """
+    host.clock.advance(usec)
+
+
+def sleep_ms(msec):
+    """! Let the given number of milliseconds go by """
+    host.clock.advance(msec * 1000)
+
+
+def sleep(sec):
+    """! Let the given number of seconds go by """
+    host.clock.advance(sec * 1000000)
+
+
+def time():
+    """! @return The number of seconds since the clock was reset """
+    return host.clock.now() // 1000000
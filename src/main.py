@@ -8,6 +8,7 @@
 """
 
 import pyb
+import struct
 import sys
 import utime
 import cotask
@@ -60,26 +61,46 @@ def get_fnumeric_input(prompt):
             sys.exit(0)
 
 
+def print_records(queue, buf):
+    """!
+    Empties a record queue of (time, position, duty) records, printing each
+    one as a line of comma separated values.
+    :param queue: The record queue to be emptied.
+    :param buf: A bytearray large enough to hold everything in the queue.
+    """
+    data = queue.drain_into(buf)
+    for offset in range(0, len(data), queue.record_size):
+        print("{},{},{}".format(*struct.unpack_from(queue.format, data,
+                                                    offset)))
+
+
 # Share function created by JR Ridgely
 def task1_fun(shares):
-    kp, setpoint, data, reset = shares
+    params, data, reset = shares
 
     # Create the motor and motor encoder objects
     m0 = MotorDriver(pyb.Pin.board.PA10, pyb.Pin.board.PB4, pyb.Pin.board.PB5, 3)
     enc0 = EncoderReader(pyb.Pin.board.PB6, pyb.Pin.board.PB7, 4)
 
     while True:
-        con = Control(kp.get(), setpoint.get(), initial_output=0)
+        seen = params.version()
+        kp, setpoint = params.get()
+        con = Control(kp, setpoint, initial_output=0)
 
         while reset.get() == 0:
-            con.set_setpoint(setpoint.get())
-            con.set_Kp(kp.get())
+            # Only read and apply the parameters when they've been changed
+            if params.changed(seen):
+                seen = params.version()
+                kp, setpoint = params.get()
+                con.set_setpoint(setpoint)
+                con.set_Kp(kp)
 
             measured_output = -enc0.read()
-            motor_actuation = con.run(setpoint.get(), measured_output)
+            motor_actuation = con.run(setpoint, measured_output)
             m0.set_duty_cycle(motor_actuation)
 
-            data.put(measured_output)
+            data.put(utime.ticks_us(), measured_output,
+                     int(max(-100, min(100, motor_actuation))))
             yield 0
 
         # Reset
@@ -88,24 +109,31 @@ def task1_fun(shares):
         yield 0
 
 def task2_fun(shares):
-    kp, setpoint, data, reset = shares
+    params, data, reset = shares
 
     # Create the motor and motor encoder objects
     enc1 = EncoderReader(pyb.Pin.board.PC6, pyb.Pin.board.PC7, 8)
     m1 = MotorDriver(pyb.Pin.board.PC1, pyb.Pin.board.PA0, pyb.Pin.board.PA1, 5)
 
     while True:
-        con = Control(kp.get(), setpoint.get(), initial_output=0)
+        seen = params.version()
+        kp, setpoint = params.get()
+        con = Control(kp, setpoint, initial_output=0)
 
         while reset.get() == 0:
-            con.set_setpoint(setpoint.get())
-            con.set_Kp(kp.get())
+            # Only read and apply the parameters when they've been changed
+            if params.changed(seen):
+                seen = params.version()
+                kp, setpoint = params.get()
+                con.set_setpoint(setpoint)
+                con.set_Kp(kp)
 
             measured_output = -enc1.read()
-            motor_actuation = con.run(setpoint.get(), measured_output)
+            motor_actuation = con.run(setpoint, measured_output)
             m1.set_duty_cycle(motor_actuation)
 
-            data.put(measured_output)
+            data.put(utime.ticks_us(), measured_output,
+                     int(max(-100, min(100, motor_actuation))))
             yield 0
 
         # Reset
@@ -121,23 +149,29 @@ if __name__ == "__main__":
     print("Testing ME405 stuff in cotask.py and task_share.py\r\n"
           "Press Ctrl-C to stop and show diagnostics.")
 
+    # Carve the buffers of the shares and queues out of one block of memory;
+    # the two data queues take 10000 bytes each
+    task_share.use_arena(20480)
+
     # Create a share and a queue to test function and diagnostic printouts
-    m0Kp = task_share.Share('f', thread_protect=False, name="m0 kp")
-    m1Kp = task_share.Share('f', thread_protect=False, name="m1 kp")
+    # Each motor's gain and setpoint are changed together
+    m0Params = task_share.SeqShare(('f', 'l'), thread_protect=False,
+                                   name="m0 params")
+    m1Params = task_share.SeqShare(('f', 'l'), thread_protect=False,
+                                   name="m1 params")
 
     reset = task_share.Share('b', thread_protect=False, name="reset")
 
-    m0setpoint = task_share.Share('l', thread_protect=False,
-                                  name="m0 setpoint")
-    m1setpoint = task_share.Share('l', thread_protect=False,
-                                  name="m1 setpoint")
-
-    m0Data = task_share.Queue('L', 1000, thread_protect=False,
-                              overwrite=True,
-                              name="M0 data")
-    m1Data = task_share.Queue('L', 1000, thread_protect=False,
-                              overwrite=True,
-                              name="M1 data")
+    # Each record holds the time in microseconds, the position, and the duty
+    m0Data = task_share.RecordQueue(('I', 'l', 'h'), 1000,
+                                    thread_protect=False, overwrite=True,
+                                    name="M0 data")
+    m1Data = task_share.RecordQueue(('I', 'l', 'h'), 1000,
+                                    thread_protect=False, overwrite=True,
+                                    name="M1 data")
+    # Buffer into which the data queues are emptied for printing
+    dump_buf = bytearray(1000 * m0Data.record_size)
+
     # Create the tasks. If trace is enabled for any task, memory will be
     # allocated for state transition tracing, and the application will run out
     # of memory after a while and quit. Therefore, use tracing only for 
@@ -147,12 +181,12 @@ if __name__ == "__main__":
     m0Task = cotask.Task(task1_fun, name="Motor 0 Driver", priority=1,
                          period=10,
                          profile=True, trace=False,
-                         shares=(m0Kp, m0setpoint, m0Data, reset))
+                         shares=(m0Params, m0Data, reset))
 
     m1Task = cotask.Task(task2_fun, name="Motor 1 Driver", priority=1,
                          period=10,
                          profile=True, trace=False,
-                         shares=(m1Kp, m1setpoint, m1Data, reset))
+                         shares=(m1Params, m1Data, reset))
 
     task_list.append(m0Task)
     task_list.append(m1Task)
@@ -162,50 +196,56 @@ if __name__ == "__main__":
 
     # Run the scheduler with the chosen scheduling algorithm. Quit if ^C pressed
     print("Starting tasks!")
-    while True:
-        print("?????")
-        m0Kp.put(get_fnumeric_input("$a Set Motor 0 kp: "))
-        m1Kp.put(get_fnumeric_input("$b Set Motor 1 kp: "))
-        print("?????")
+    try:
+        while True:
+            print("?????")
+            m0kp = get_fnumeric_input("$a Set Motor 0 kp: ")
+            m1kp = get_fnumeric_input("$b Set Motor 1 kp: ")
+            print("?????")
+
+            m0Params.put(m0kp, get_inumeric_input("$c Set Motor 0 setpoint: "))
+            m1Params.put(m1kp, get_inumeric_input("$d Set Motor 1 setpoint: "))
 
-        m0setpoint.put(get_inumeric_input("$c Set Motor 0 setpoint: "))
-        m1setpoint.put(get_inumeric_input("$d Set Motor 1 setpoint: "))
+            per = get_inumeric_input("$e Enter Task Period: ")
 
-        per = get_inumeric_input("$e Enter Task Period: ")
+            # Stagger the motor tasks so they aren't both due at the same time
+            task_list.set_period((m0Task, m1Task), per, stagger=True)
 
-        m0Task.set_period(per)
-        m1Task.set_period(per)
+            # Warn if the run times measured last time won't fit this period
+            if task_list.busy_us:
+                ok, report = task_list.schedulability()
+                if not ok:
+                    print(report)
 
-        m0Data.clear()
-        m1Data.clear()
-        m0Task.reset_profile()
-        m1Task.reset_profile()
+            m0Data.clear()
+            m1Data.clear()
+            m0Task.reset_profile()
+            m1Task.reset_profile()
+            task_list.reset_load()
 
-        s = utime.ticks_ms()
-        while utime.ticks_ms() - s < 1000:
-            task_list.pri_sched()
+            task_list.run_for(1000)
+            print("CPU load: {:.1f}%".format(task_list.load() * 100.0))
 
-        # Print data
-        print("$f M0 data")
-        for _ in range(m0Data.num_in()):
-            print(m0Data.get())
-        print("$g End Data")
+            # Print data
+            print("$f M0 data")
+            print_records(m0Data, dump_buf)
+            print("$g End Data")
 
-        print("$h M1 data")
-        for _ in range(m1Data.num_in()):
-            print(m1Data.get())
-        print("$i End Data")
+            print("$h M1 data")
+            print_records(m1Data, dump_buf)
+            print("$i End Data")
 
-        reset.put(1)
-        s = utime.ticks_ms()
-        while utime.ticks_ms() - s < 1000:
-            task_list.pri_sched()
+            reset.put(1)
+            task_list.run_for(1000)
 
-        reset.put(0)
+            reset.put(0)
+    except KeyboardInterrupt:
+        pass
 
     # Print a table of task data and a table of shared information data
-    print('\n' + str(cotask.task_list))
+    print('\n' + str(task_list))
     print(task_share.show_all())
+    print(task_share.show_memory())
     print(m0Task.get_trace())
     print(m1Task.get_trace())
     print('')
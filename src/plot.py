@@ -87,6 +87,27 @@ def read_csv(end_tok):
     return csv
 
 
+def parse_records(csv):
+    """!
+    Splits the lines of "time,position,duty" records sent by the board
+    into separate lists.
+    :param csv: The lines read by read_csv
+    :return: Lists of the times in milliseconds since the first record,
+    the positions in encoder counts, and the duty cycles
+    """
+    times, positions, duties = [], [], []
+    t0 = None
+    for line in csv:
+        t, pos, duty = (int(v) for v in line.split(","))
+        if t0 is None:
+            t0 = t
+        # The board's microsecond clock wraps around at 2**30
+        times.append(((t - t0) % 2**30) / 1000)
+        positions.append(pos)
+        duties.append(duty)
+    return times, positions, duties
+
+
 def run_step_response(s, kPs, setpoints, period, t_tot=1):
     """!
     Runs the step response of the motor.
@@ -133,11 +154,9 @@ def plot_period_tests(s, periods):
     sp = 16000
     for p in periods:
         m0, m1 = run_step_response(s, (.05, 0), (sp, 0), p)
-        m0 = [int(m) if -4294967 < int(m) < 4294967 else 0 for m in m0]
+        t, m0, _ = parse_records(m0)
         print(m0)
 
-        t = list(range(0, len(m0) * p, p))
-
         plt.plot(t, m0, label=f"period={p}")
         # time.sleep(1)
 
@@ -163,7 +182,7 @@ def position_tests(s, m0_poss, m1_poss, per):
     m1_tot = []
     for p in zip(m0_poss, m1_poss):
         m0, m1 = run_step_response(s, (.05, .05), p, per)
-        m0, m1 = [int(m) for m in m0], [int(m) for m in m1]
+        m0, m1 = parse_records(m0)[1], parse_records(m1)[1]
 
         m0_tot.append(m0)
         m1_tot.append(m1)
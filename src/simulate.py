@@ -0,0 +1,84 @@
+"""!
+@file simulate.py
+Runs the motor control tasks from main.py on the host computer against a
+simulated motor, using the stand-in modules in @c host, and plots the step
+responses for several task periods as @c plot.py does with the real board.
+"""
+import time
+
+import host
+host.install()
+
+import cotask
+import task_share
+import main
+from host.plant import Motor
+
+
+def step_response(kp, setpoint, period, duration=1000):
+    """!
+    Simulates one step response of motor 0 from a standstill.
+    :param kp: The proportional controller gain for the motor
+    :param setpoint: The desired encoder position
+    :param period: The period of the motor task in milliseconds
+    :param duration: The length of the simulated run in milliseconds
+    :return: Lists of the times in milliseconds and the encoder positions
+    recorded by the task
+    """
+    host.reset()
+    del task_share.share_list[:]
+
+    # The motor model is exact however long its steps are, and nothing else
+    # is attached to the clock, so it needn't be stepped in short slices
+    host.clock.max_step = 1000000000
+
+    # The encoder counts down when the motor is driven forward, which is why
+    # main.py negates the encoder reading
+    Motor(3, 4, gain=-800.0)
+
+    params = task_share.SeqShare(('f', 'l'), thread_protect=False,
+                                 name="params")
+    reset = task_share.Share('b', thread_protect=False, name="reset")
+    data = task_share.RecordQueue(('I', 'l', 'h'), 1000, thread_protect=False,
+                                  overwrite=True, name="data")
+    params.put(kp, setpoint)
+
+    task_list = cotask.TaskList()
+    task_list.append(cotask.Task(main.task1_fun, name="Motor 0 Driver",
+                                 priority=1, period=period,
+                                 shares=(params, data, reset)))
+    task_list.run_for(duration)
+
+    records = [data.get() for _ in range(data.num_in())]
+    return ([rec[0] / 1000 for rec in records],
+            [rec[1] for rec in records])
+
+
+def plot_period_tests(periods, runs=100):
+    """!
+    Simulates and plots step responses for the given task periods, and
+    reports how quickly the simulation runs.
+    :param periods: The task periods to try, in milliseconds
+    :param runs: The number of times to repeat each simulation for timing
+    """
+    import matplotlib.pyplot as plt
+
+    sp = 16000
+    for p in periods:
+        start = time.perf_counter()
+        for _ in range(runs):
+            t, m0 = step_response(.05, sp, p)
+        elapsed = time.perf_counter() - start
+        print(f"period={p}: {runs / elapsed:.0f} simulated runs per second")
+
+        plt.plot(t, m0, label=f"period={p}")
+
+    plt.legend(loc='lower right')
+    plt.xlabel("Time (ms)")
+    plt.ylabel("Position (enc count)")
+    plt.title("Simulated Step Response")
+    plt.show()
+
+
+if __name__ == "__main__":
+    plot_period_tests([10, 25, 40, 60, 100])
@@ -25,6 +25,8 @@ SOFTWARE, EVEN IF ADVISED OF THE POSSIBILITY OF SUCH DAMAGE.
 import array
 import gc
 import pyb
+import struct
+import utime
 import micropython
 
 
@@ -32,6 +34,20 @@ import micropython
 #  used to create diagnostic printouts. 
 share_list = []
 
+## The arena from which buffers are carved after @c use_arena() is called,
+#  or @c None if each buffer is allocated from the heap
+_arena = None
+
+## The number of bytes of the arena which have been handed out
+_arena_used = 0
+
+## The free heap, in bytes, before the first buffer or arena was allocated
+_heap_start = None
+
+## @c True under MicroPython, whose heap benefits from collecting garbage
+#  after each large allocation
+_ON_BOARD = hasattr (gc, 'mem_free')
+
 ## This dictionary allows readable printouts of queue and share data types.
 type_code_strings = {'b' : "int8",   'B' : "uint8",
                      'h' : "int16",  'H' : "uint16",
@@ -51,6 +67,189 @@ def show_all ():
     return '\n'.join (gen)
 
 
+def use_arena (nbytes):
+    """!
+    Allocate one block of memory from which the buffers of all queues and
+    shares created afterwards are carved.
+
+    Allocating every buffer separately spreads them around the heap, and
+    each queue runs the garbage collector after it's made. With an arena,
+    the heap is tidied once and the memory for all the buffers is taken in
+    one piece, so starting up is faster and there's no fragmentation
+    between buffers. Call this at the start of the program, before any
+    queue or share is created, with a size found from @c show_memory():
+    @code
+    task_share.use_arena (16000)
+    ...create queues and shares...
+    print (task_share.show_memory ())
+    @endcode
+    Where @c memoryview has no @c cast() method, as in MicroPython, only
+    byte buffers such as those of a @c RecordQueue can be carved from the
+    arena; typed buffers are then allocated from the heap as usual, and
+    @c show_memory() shows where each buffer is.
+    @param nbytes The size of the arena in bytes
+    """
+    global _arena, _arena_used, _heap_start
+
+    gc.collect ()
+    if _heap_start is None:
+        _heap_start = _mem_free ()
+    _arena = bytearray (nbytes)
+    _arena_used = 0
+
+
+def _alloc (share, type_code, count):
+    """!
+    Allocate a zeroed buffer for a queue or share, carving it from the
+    arena if there is one and counting its size for @c show_memory().
+    @param share The queue or share which will own the buffer
+    @param type_code The buffer's array type code, or @c None for a buffer
+           of bytes
+    @param count The number of items in the buffer
+    @return An @c array.array, a @c bytearray, or a @c memoryview of the
+            arena with the given type
+    """
+    global _arena_used, _heap_start
+
+    if _heap_start is None:
+        _heap_start = _mem_free ()
+    nbytes = count * (struct.calcsize (type_code) if type_code else 1)
+
+    if _arena is not None:
+        start = (_arena_used + 7) & ~7             # Keep 64-bit alignment
+        if start + nbytes > len (_arena):
+            _unregister (share)
+            raise MemoryError ('Arena full: {:d} bytes needed, {:d} left'
+                               .format (nbytes, len (_arena) - start))
+        view = memoryview (_arena)[start:start + nbytes]
+        if type_code is not None:
+            try:
+                view = view.cast (type_code)
+            except AttributeError:
+                view = None
+        if view is not None:
+            _arena_used = start + nbytes
+            share._arena_bytes += nbytes
+            return view
+
+    # An array made from a bytearray takes its contents as raw bytes, which
+    # is much quicker than converting a range of numbers one at a time
+    try:
+        if type_code is None:
+            buf = bytearray (nbytes)
+        else:
+            buf = array.array (type_code, bytearray (nbytes))
+    except MemoryError:
+        _unregister (share)
+        raise
+    share._heap_bytes += nbytes
+    return buf
+
+
+def _tidy_heap ():
+    """!
+    Run the garbage collector after a buffer has been allocated, to neaten
+    up what memory is left. This isn't needed if the buffer came from the
+    arena, nor under CPython on a PC (which has no @c gc.mem_free()), whose
+    memory is managed differently; there it only slows down simulations
+    which make many queues.
+    """
+    if _arena is None and _ON_BOARD:
+        gc.collect ()
+
+
+def _unregister (share):
+    """!
+    Take a queue or share whose buffer couldn't be allocated out of the
+    list of shares, so that diagnostic printouts don't find it half made.
+    @param share The queue or share which couldn't be made
+    """
+    if share in share_list:
+        share_list.remove (share)
+
+
+def _mem_free ():
+    """!
+    Find how much heap memory is free, if the Python in use can tell.
+    @return The number of free bytes, or @c None if it isn't known
+    """
+    try:
+        return gc.mem_free ()
+    except AttributeError:
+        return None
+
+
+def _largest_block ():
+    """!
+    Find the largest block of memory which can be allocated, by trying to
+    allocate blocks in a binary search. This is slow and should only be done
+    for diagnostic reports.
+    @return The size of the largest free block in bytes, or @c None if the
+            amount of free memory isn't known
+    """
+    low = 0
+    high = _mem_free ()
+    if high is None:
+        return None
+    while low < high:
+        mid = (low + high + 1) // 2
+        gc.collect ()
+        try:
+            block = bytearray (mid)
+            block = None
+            low = mid
+        except MemoryError:
+            high = mid - 1
+    gc.collect ()
+    return low
+
+
+def show_memory ():
+    """!
+    Create a string showing how much memory the buffers of each queue and
+    share use and where they are, followed by the totals and the state of
+    the heap. This is meant to be printed along with @c show_all() to help
+    size logs and plan for more tasks.
+    @return A string holding the memory budget report
+    """
+    lines = ['{:<12s} {:>8s} {:>8s}'.format ('Share', 'Arena', 'Heap')]
+    total_arena = 0
+    total_heap = 0
+    for item in share_list:
+        lines.append ('{:<12s} {:8d} {:8d}'.format (item._name,
+                      item._arena_bytes, item._heap_bytes))
+        total_arena += item._arena_bytes
+        total_heap += item._heap_bytes
+    lines.append ('{:<12s} {:8d} {:8d}'.format ('Total', total_arena,
+                                                total_heap))
+    if _arena is not None:
+        lines.append ('Arena: {:d} of {:d} bytes used'.format (_arena_used,
+                                                               len (_arena)))
+
+    free = _mem_free ()
+    if free is None:
+        lines.append ('Heap: free memory not known')
+    else:
+        largest = _largest_block ()
+        free = _mem_free ()
+        lines.append ('Heap: {:s} bytes free at start, {:d} now, largest '
+                      'block {:d} ({:d}% fragmented)'.format (
+                      str (_heap_start), free, largest,
+                      100 - largest * 100 // free if free else 0))
+    return '\n'.join (lines)
+
+
+def stats_all ():
+    """!
+    Collect the throughput statistics of each queue and share in the system
+    in a form which a program can use, for example to be sent to a PC for
+    analysis.
+    @return A dictionary whose keys are queue and share names and whose
+            values are dictionaries returned by each one's @c stats() method
+    """
+    return {item._name: item.stats () for item in share_list}
+
+
 # ============================================================================
 
 class BaseShare:
@@ -62,7 +261,8 @@ class BaseShare:
     classes @c Queue and @c Share. 
     """
 
-    def __init__ (self, type_code, thread_protect = True, name = None):
+    def __init__ (self, type_code, thread_protect = True, name = None,
+                  subscribers = ()):
         """!
         Create a base queue object when called by a child class initializer.
 
@@ -71,10 +271,113 @@ class BaseShare:
         self._type_code = type_code
         self._thread_protect = thread_protect
 
+        # Bytes of buffer taken from the arena and from the heap
+        self._arena_bytes = 0
+        self._heap_bytes = 0
+
+        # Tasks whose go() methods are called when data is put in here
+        self._subscribers = list (subscribers)
+
+        # A share holds one item; queues set their own size and fill level
+        self._size = 1
+        self._max_full = 0
+        self._reset_stats ()
+
         # Add this queue to the global share and queue list
         share_list.append (self)
 
 
+    def _reset_stats (self):
+        """!
+        Reset the throughput counters kept by queues and shares. These are
+        cheap enough to be kept all the time: counting costs an addition per
+        operation.
+        """
+        self._puts = 0
+        self._gets = 0
+        self._overwritten = 0
+        self._rejected = 0
+        self._peak_rate = 0.0
+        self._rate_puts = 0
+        self._rate_time = utime.ticks_ms ()
+
+
+    def stats (self):
+        """!
+        Get a queue's or share's throughput statistics. A share counts as a
+        queue of size one which is never overwritten or full.
+
+        The peak rate is the highest rate at which items were put in over
+        the intervals between calls to this method, so it's most useful when
+        this method is called regularly, for example once a second by a
+        diagnostic task.
+        @return A dictionary holding the number of items put in (@c puts)
+                and taken out (@c gets), the number of old items overwritten
+                (@c overwritten), the number of items dropped because the
+                queue was full and the caller couldn't wait, as in an ISR or
+                @c put_many() (@c rejected), the most items in the
+                queue at once (@c max_full), the queue's @c size, and the
+                peak rate of puts in items per second (@c peak_rate)
+        """
+        now = utime.ticks_ms ()
+        elapsed = utime.ticks_diff (now, self._rate_time)
+        if elapsed > 0:
+            rate = (self._puts - self._rate_puts) * 1000.0 / elapsed
+            if rate > self._peak_rate:
+                self._peak_rate = rate
+            self._rate_puts = self._puts
+            self._rate_time = now
+
+        return {'puts': self._puts, 'gets': self._gets,
+                'overwritten': self._overwritten, 'rejected': self._rejected,
+                'max_full': self._max_full, 'size': self._size,
+                'peak_rate': self._peak_rate}
+
+
+    def _stats_str (self):
+        """!
+        Make a string showing a queue's or share's throughput counters for
+        @c __repr__.
+        """
+        return ' Puts {:d} Gets {:d} Over {:d} Rej {:d}'.format (self._puts,
+            self._gets, self._overwritten, self._rejected)
+
+
+    def subscribe (self, task):
+        """!
+        Have a task woken up whenever data is put into this queue or share.
+
+        Each time @c put() succeeds, the @c go() method of each subscribed
+        task is called, so a task which has no period will be run by the
+        scheduler soon after data arrives rather than having to poll for it.
+        This works for data put in by an interrupt service routine as well.
+        @param task The task to be woken up
+        """
+        if task not in self._subscribers:
+            self._subscribers.append (task)
+
+
+    def unsubscribe (self, task):
+        """!
+        Stop waking up a task which was subscribed with @c subscribe().
+        @param task The task which no longer needs to be woken up
+        """
+        if task in self._subscribers:
+            self._subscribers.remove (task)
+
+
+    @micropython.native
+    def _wake (self):
+        """!
+        Wake up the tasks which are waiting for data to be put in. This is
+        called by each @c put() method, from an ISR or not, so it doesn't
+        allocate memory.
+        """
+        if self._subscribers:
+            for task in self._subscribers:
+                task.go ()
+
+
 # ============================================================================
 
 class Queue (BaseShare):
@@ -105,7 +408,7 @@ class Queue (BaseShare):
     ser_num = 0
 
     def __init__ (self, type_code, size, thread_protect = False, 
-                  overwrite = False, name = None):
+                  overwrite = False, name = None, subscribers = ()):
         """!
         Initialize a queue object to carry and buffer data between tasks.
 
@@ -132,10 +435,12 @@ class Queue (BaseShare):
                data if the queue becomes full 
         @param name A short name for the queue, default @c QueueN where @c N
                is a serial number for the queue
+        @param subscribers Tasks to be woken up when data is put into the
+               queue; see @c subscribe()
 
         """
         # First call the parent class initializer
-        super ().__init__ (type_code, thread_protect, name)
+        super ().__init__ (type_code, thread_protect, name, subscribers)
 
         self._size = size
         self._overwrite = overwrite
@@ -145,7 +450,7 @@ class Queue (BaseShare):
 
         # Allocate memory in which the queue's data will be stored
         try:
-            self._buffer = array.array (type_code, range (size))
+            self._buffer = _alloc (self, type_code, size)
         except MemoryError:
             self._buffer = None
             raise
@@ -158,7 +463,7 @@ class Queue (BaseShare):
 
         # Since we may have allocated a bunch of memory, call the garbage
         # collector to neaten up what memory is left for future use
-        gc.collect ()
+        _tidy_heap ()
 
 
     @micropython.native
@@ -180,31 +485,39 @@ class Queue (BaseShare):
         |               my_queue.put (create_something_to_put ())
         |           yield 0
         @endcode
+        See also @c try_put(), @c put_timeout() and @c put_wait().
         @param item The item to be placed into the queue
         @param in_ISR Set this to @c True if calling from within an ISR
         """
         # If we're in an ISR and the queue is full and we're not allowed to
         # overwrite data, we have to give up and exit
-        if self.full ():
+        if self.full () and not self._overwrite:
             if in_ISR:
+                self._rejected += 1
                 return
 
-            # Wait (if needed) until there's room in the buffer for the data
-            if not self._overwrite:
-                while self.full ():
-                    pass
+            # Wait until there's room in the buffer for the data
+            while self.full ():
+                pass
 
         # Prevent data corruption by blocking interrupts during data transfer
         if self._thread_protect and not in_ISR:
             _irq_state = pyb.disable_irq ()
 
-        # Write the data and advance the counts and pointers
+        self._puts += 1
+
+        # Write the data and advance the counts and pointers. If the queue
+        # was full, the oldest item has just been overwritten, so the read
+        # pointer moves on to the next oldest
         self._buffer[self._wr_idx] = item
         self._wr_idx += 1
         if self._wr_idx >= self._size:
             self._wr_idx = 0
         self._num_items += 1
         if self._num_items >= self._size:        # Can't be fuller than full
+            if self._num_items > self._size:
+                self._rd_idx = self._wr_idx
+                self._overwritten += 1
             self._num_items = self._size
         if self._num_items > self._max_full:     # Record maximum fillage
             self._max_full = self._num_items
@@ -213,6 +526,9 @@ class Queue (BaseShare):
         if self._thread_protect and not in_ISR:
             pyb.enable_irq (_irq_state)
 
+        # Wake up any tasks waiting for data
+        self._wake ()
+
 
     @micropython.native
     def get (self, in_ISR = False):
@@ -233,6 +549,7 @@ class Queue (BaseShare):
         |           # More loop stuff
         |           yield 0
         @endcode
+        See also @c try_get(), @c get_timeout() and @c get_wait().
         @param in_ISR Set this to @c True if calling from within an ISR
         """
         # Wait until there's something in the queue to be returned
@@ -253,6 +570,7 @@ class Queue (BaseShare):
         self._num_items -= 1
         if self._num_items < 0:
             self._num_items = 0
+        self._gets += 1
 
         # Re-enable interrupts
         if self._thread_protect and not in_ISR:
@@ -261,6 +579,334 @@ class Queue (BaseShare):
         return (to_return)
 
 
+    def try_put (self, item, in_ISR = False):
+        """!
+        Put an item into the queue if there's room, without waiting.
+
+        A queue which may overwrite old data always has room.
+        @param item The item to be placed into the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return @c True if the item was put into the queue, @c False if the
+                queue was full
+        """
+        if self.full () and not self._overwrite:
+            return False
+        self.put (item, in_ISR)
+        return True
+
+
+    def try_get (self, default = None, in_ISR = False):
+        """!
+        Read an item from the queue if there is one, without waiting.
+        @param default The value to return if the queue is empty
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The oldest item in the queue, or @c default if it's empty
+        """
+        if self.empty ():
+            return default
+        return self.get (in_ISR)
+
+
+    def put_timeout (self, item, timeout):
+        """!
+        Put an item into the queue, waiting at most the given time for room.
+        This blocks the caller (and so the whole scheduler, if called from
+        a task) while waiting; in a task, @c put_wait() is usually better.
+        @param item The item to be placed into the queue
+        @param timeout The longest time to wait, in milliseconds
+        @return @c True if the item was put into the queue, @c False if the
+                time ran out first
+        """
+        start = utime.ticks_ms ()
+        while not self.try_put (item):
+            if utime.ticks_diff (utime.ticks_ms (), start) >= timeout:
+                return False
+        return True
+
+
+    def get_timeout (self, timeout, default = None):
+        """!
+        Read an item from the queue, waiting at most the given time for one.
+        This blocks the caller while waiting; in a task, @c get_wait() is
+        usually better.
+        @param timeout The longest time to wait, in milliseconds
+        @param default The value to return if the time runs out
+        @return The oldest item in the queue, or @c default if none arrived
+        """
+        start = utime.ticks_ms ()
+        while self.empty ():
+            if utime.ticks_diff (utime.ticks_ms (), start) >= timeout:
+                return default
+        return self.get ()
+
+
+    def put_wait (self, item, state = 0):
+        """!
+        Put an item into the queue from within a task, yielding to the
+        scheduler rather than blocking while the queue is full.
+
+        This is a generator which must be used with @c yield @c from inside a
+        task's generator function. Each time the queue is found to be full,
+        it yields @c state, so the task gives up the CPU to other tasks and
+        tries again the next time it runs:
+        @code
+        |   def producer_task ():
+        |       while True:
+        |           yield from my_queue.put_wait (make_something ())
+        |           yield 0
+        @endcode
+        @param item The item to be placed into the queue
+        @param state The state to yield while waiting
+        """
+        while not self.try_put (item):
+            yield state
+
+
+    def get_wait (self, state = 0):
+        """!
+        Read an item from the queue from within a task, yielding to the
+        scheduler rather than blocking while the queue is empty.
+
+        This is a generator which must be used with @c yield @c from inside a
+        task's generator function; the item read is the value of the
+        @c yield @c from expression:
+        @code
+        |   def consumer_task ():
+        |       while True:
+        |           something = yield from my_queue.get_wait ()
+        |           do_something_with (something)
+        |           yield 0
+        @endcode
+        @param state The state to yield while waiting
+        @return The oldest item in the queue
+        """
+        while self.empty ():
+            yield state
+        return self.get ()
+
+
+    def get_many (self, buf, max_items = None, in_ISR = False):
+        """!
+        Read a batch of items from the queue into an array or memoryview.
+
+        The oldest items are copied into the start of @c buf in the order in
+        which they were put into the queue. This method doesn't wait for
+        items; it reads as many as are available, up to the size of @c buf or
+        @c max_items. Interrupts are disabled only once for the whole batch.
+        @code
+        |   buf = array.array ('L', range (100))
+        |   num = my_queue.get_many (buf)
+        |   for item in buf[:num]:
+        |       print (item)
+        @endcode
+        @param buf An @c array.array or @c memoryview with the same type code
+               as the queue, into which items are copied
+        @param max_items The most items to read, or @c None to fill @c buf
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items read
+        """
+        dest = memoryview (buf)
+        src = memoryview (self._buffer)
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        count = self._num_items
+        if count > len (dest):
+            count = len (dest)
+        if max_items is not None and count > max_items:
+            count = max_items
+
+        # The items may wrap around the end of the buffer; if so, they're
+        # copied in two pieces
+        rd_idx = self._rd_idx
+        first = self._size - rd_idx
+        if first > count:
+            first = count
+        dest[0:first] = src[rd_idx:rd_idx + first]
+        if count > first:
+            dest[first:count] = src[0:count - first]
+
+        rd_idx += count
+        if rd_idx >= self._size:
+            rd_idx -= self._size
+        self._rd_idx = rd_idx
+        self._num_items -= count
+        self._gets += count
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        return count
+
+
+    def drain_into (self, buf, in_ISR = False):
+        """!
+        Move everything in the queue, oldest first, into an array or
+        memoryview, which should be at least as large as the queue.
+        @code
+        |   for item in my_queue.drain_into (dump_buffer):
+        |       print (item)
+        @endcode
+        @param buf An @c array.array or @c memoryview with the same type code
+               as the queue, into which items are copied
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return A memoryview of the part of @c buf which was filled
+        """
+        return memoryview (buf)[:self.get_many (buf, None, in_ISR)]
+
+
+    def snapshot (self, in_ISR = False):
+        """!
+        Get views of the queue's contents, oldest first, without copying
+        or removing them.
+
+        The items may wrap around the end of the queue's buffer, so two
+        @c memoryview objects are returned; the items in the first come
+        before those in the second, which is empty if there was no wrap.
+        The views can be passed straight to something like @c uart.write()
+        or a hash function. Once they have been used, @c commit_read() can be
+        called to remove the items from the queue:
+        @code
+        |   first, second = my_queue.snapshot ()
+        |   uart.write (first)
+        |   uart.write (second)
+        |   my_queue.commit_read (len (first) + len (second))
+        @endcode
+        The views look at the queue's own buffer, so items which are put in
+        while the views are in use can change what they show if the queue
+        overwrites old data; the views should be used before that can happen.
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return A tuple of two memoryviews holding the queue's contents
+        """
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+        rd_idx = self._rd_idx
+        count = self._num_items
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        return self._views (rd_idx, count)
+
+
+    def _views (self, pos, count):
+        """!
+        Make the two memoryviews which show @c count items of the buffer,
+        starting at index @c pos and wrapping around the end if necessary.
+        @param pos The buffer index of the first item
+        @param count The number of items to show
+        @return A tuple of two memoryviews
+        """
+        view = memoryview (self._buffer)
+        first = self._size - pos
+        if first > count:
+            first = count
+        return view[pos:pos + first], view[0:count - first]
+
+
+    def commit_read (self, count, in_ISR = False):
+        """!
+        Remove items from the front of the queue without reading them,
+        usually after they have been used through @c snapshot().
+        @param count The number of items to remove; if there are fewer in the
+               queue, it is emptied
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items removed
+        """
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        if count > self._num_items:
+            count = self._num_items
+        self._rd_idx += count
+        if self._rd_idx >= self._size:
+            self._rd_idx -= self._size
+        self._num_items -= count
+        self._gets += count
+
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+        return count
+
+
+    def put_many (self, items, in_ISR = False):
+        """!
+        Put a batch of items into the queue.
+
+        The items are written in order, with interrupts disabled only once for
+        the whole batch. This method doesn't wait for room in the queue. If
+        the queue was created with @c overwrite set to @c True, old data is
+        overwritten as needed; if not, only as many items as there's room
+        for are put in.
+        @param items An @c array.array or @c memoryview with the same type
+               code as the queue, or a list or tuple of items
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of items put into the queue
+        """
+        count = len (items)
+        try:
+            src = memoryview (items)
+        except TypeError:
+            src = None
+        dest = memoryview (self._buffer)
+
+        # Prevent data corruption by blocking interrupts during data transfer
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        # Without overwriting, only put in what fits; with it, only the last
+        # (size) items of the batch would survive anyway
+        if not self._overwrite:
+            if count > self._size - self._num_items:
+                count = self._size - self._num_items
+            start = 0
+        elif count > self._size:
+            start = count - self._size
+            count = self._size
+        else:
+            start = 0
+
+        wr_idx = self._wr_idx
+        first = self._size - wr_idx
+        if first > count:
+            first = count
+        if src is not None:
+            dest[wr_idx:wr_idx + first] = src[start:start + first]
+            if count > first:
+                dest[0:count - first] = src[start + first:start + count]
+        else:
+            for idx in range (count):
+                dest[(wr_idx + idx) % self._size] = items[start + idx]
+
+        wr_idx += count
+        if wr_idx >= self._size:
+            wr_idx -= self._size
+        self._wr_idx = wr_idx
+        self._puts += start + count
+        self._overwritten += start
+        self._rejected += len (items) - start - count
+        self._num_items += count
+        if self._num_items >= self._size:
+            if self._num_items > self._size:
+                self._rd_idx = wr_idx
+                self._overwritten += self._num_items - self._size
+            self._num_items = self._size
+        if self._num_items > self._max_full:
+            self._max_full = self._num_items
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        # Wake up any tasks waiting for data
+        if count:
+            self._wake ()
+
+        return count
+
+
     @micropython.native
     def any (self):
         """!
@@ -317,6 +963,7 @@ class Queue (BaseShare):
         self._wr_idx = 0
         self._num_items = 0
         self._max_full = 0
+        self._reset_stats ()
 
 
     def __repr__ (self):
@@ -327,100 +974,1297 @@ class Queue (BaseShare):
         items and queue size. 
         """
         return ('{:<12s} Queue<{:s}> Max Full {:d}/{:d}'.format (self._name,
-                type_code_strings[self._type_code], self._max_full, self._size))
+                type_code_strings[self._type_code], self._max_full, self._size)
+                + self._stats_str ())
 
 
 # ============================================================================
 
-class Share (BaseShare):
+class SPSCQueue (Queue):
     """!
-    An item which holds data to be shared between tasks.
-    This class implements a shared data item which can be protected against
-    data corruption by pre-emptive multithreading. Multithreading which can
-    corrupt shared data includes the use of ordinary interrupts as well as the
-    use of pre-emptive multithreading such as by a Real-Time Operating System
-    (RTOS).
- 
-    An example of the creation and use of a share is as follows:
+    A queue for one producer and one consumer which needs no interrupt
+    masking.
+
+    In an ordinary queue, both @c put() and @c get() change the count of
+    items in the queue, so interrupts must be disabled while either one runs
+    if the other might be called from an interrupt. In this queue the
+    producer only changes the write index and the consumer only changes the
+    read index; the number of items is worked out from the two indices. Each
+    index is written in one step after the data has been moved, so an
+    interrupt service routine can put items in while a task takes them out
+    (or the other way around) without disabling interrupts at all. This keeps
+    a fast producer such as an encoder sampling ISR from delaying other
+    interrupts such as those for motor PWM.
+
+    Only one task or ISR may put items into an @c SPSCQueue and only one may
+    take them out. Overwriting isn't possible, as it would require the
+    producer to move the read index; when the queue is full, a put from an
+    ISR is dropped and a put from a task waits.
     @code
     import task_share
 
-    # This share holds a signed short (16-bit) integer
-    my_share = task_share.Queue ('h', name="My Share")
+    samples = task_share.SPSCQueue ('l', 200, name="Samples")
 
-    # Somewhere in one task, put data into the share
-    my_share.put (some_data)
+    # In a timer callback
+    samples.put (enc.read (), in_ISR=True)
 
-    # In another task, read data from the share
-    something = my_share.get ()
+    # In a task
+    while samples.any ():
+        process (samples.get ())
     @endcode
     """
-    ## A counter used to give serial numbers to shares for diagnostic use.
-    ser_num = 0
 
-
-    def __init__ (self, type_code, thread_protect = True, name = None):
+    def __init__ (self, type_code, size, name = None, subscribers = ()):
         """!
-        Create a shared data item used to transfer data between tasks.
-
-        This method allocates memory in which the shared data will be buffered.
-
-        Each share can only carry data of one particular type which must be
-        chosen from the following list. The data type is specified by a 
-        one-letter type code which is given as for the Python @c array.array
-        type, which can be any of the following:
-        |      |      |      |
-        |:-----|:-----|:-----|
-        | **b** (signed char) | **B** (unsigned char) | 8 bit integers |
-        | **h** (signed short) | **H** (unsigned short) | 16 bit integers |
-        | **i** (signed int) | **I** (unsigned int) | 32 bit integers (probably) |
-        | **l** (signed long) | **L** (unsigned long) | 32 bit integers |
-        | **q** (signed long long) | **Q** (unsigned long long) | 64 bit integers |
-        | **f** (float) | **d** (double-precision float) | |
+        Initialize a single-producer, single-consumer queue.
 
-        @param type_code The type of data items which the share can hold
-        @param thread_protect True if mutual exclusion protection is used
-        @param name A short name for the share, default @c ShareN where @c N
-               is a serial number for the share
+        The indices run from 0 to twice the queue size so that a full queue
+        can be told apart from an empty one without a separate count.
+        @param type_code The type of data items which the queue can hold
+        @param size The maximum number of items which the queue can hold
+        @param name A short name for the queue, default @c QueueN where @c N
+               is a serial number for the queue
+        @param subscribers Tasks to be woken up when data is put into the
+               queue; see @c subscribe()
         """
-        # First call the parent class initializer
-        super ().__init__ (type_code, thread_protect, name)
-
-        self._buffer = array.array (type_code, [0])
-
-        self._name = str (name) if name != None \
-            else 'Share' + str (Share.ser_num)
-        Share.ser_num += 1
+        super ().__init__ (type_code, size, thread_protect = False,
+                           overwrite = False, name = name,
+                           subscribers = subscribers)
+        self._wrap = 2 * size
 
 
     @micropython.native
-    def put (self, data, in_ISR = False):
+    def put (self, item, in_ISR = False):
         """!
-        Write an item of data into the share.
+        Put an item into the queue. This must only be called by the producer.
 
-        This method puts data into the share; any old data is overwritten.
-        This code disables interrupts during the writing so as to prevent
-        data corrupting by an interrupt service routine which might access
-        the same data.
-        @param data The data to be put into this share
-        @param in_ISR Set this to True if calling from within an ISR
+        If the queue is full, a call from an ISR drops the item and a call
+        from a task waits until the consumer makes room.
+        @param item The item to be placed into the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
         """
+        if self.full ():
+            if in_ISR:
+                self._rejected += 1
+                return
+            while self.full ():
+                pass
 
-        # Disable interrupts before writing the data
-        if self._thread_protect and not in_ISR:
-            irq_state = pyb.disable_irq ()
+        wr_idx = self._wr_idx
+        if wr_idx >= self._size:
+            self._buffer[wr_idx - self._size] = item
+        else:
+            self._buffer[wr_idx] = item
 
-        self._buffer[0] = data
+        # Publishing the new write index makes the item visible to the reader
+        wr_idx += 1
+        if wr_idx >= self._wrap:
+            wr_idx = 0
+        self._wr_idx = wr_idx
+        self._puts += 1
 
-        # Re-enable interrupts
-        if self._thread_protect and not in_ISR:
-            pyb.enable_irq (irq_state)
+        num = self.num_in ()
+        if num > self._max_full:
+            self._max_full = num
+
+        # Wake up any tasks waiting for data
+        self._wake ()
 
 
     @micropython.native
     def get (self, in_ISR = False):
         """!
-        Read an item of data from the share.
+        Read an item from the queue, waiting until one is available. This
+        must only be called by the consumer.
+        @param in_ISR Not needed; accepted for compatibility with @c Queue
+        @return The oldest item in the queue
+        """
+        while self.empty ():
+            pass
+
+        rd_idx = self._rd_idx
+        if rd_idx >= self._size:
+            to_return = self._buffer[rd_idx - self._size]
+        else:
+            to_return = self._buffer[rd_idx]
+
+        # Publishing the new read index frees the slot for the writer
+        rd_idx += 1
+        if rd_idx >= self._wrap:
+            rd_idx = 0
+        self._rd_idx = rd_idx
+        self._gets += 1
+
+        return (to_return)
+
+
+    def get_many (self, buf, max_items = None, in_ISR = False):
+        """!
+        Read a batch of items, oldest first, into an array or memoryview.
+        This must only be called by the consumer. It doesn't wait for items.
+        @param buf An @c array.array or @c memoryview with the same type code
+               as the queue, into which items are copied
+        @param max_items The most items to read, or @c None to fill @c buf
+        @param in_ISR Not needed; accepted for compatibility with @c Queue
+        @return The number of items read
+        """
+        dest = memoryview (buf)
+        src = memoryview (self._buffer)
+
+        count = self.num_in ()
+        if count > len (dest):
+            count = len (dest)
+        if max_items is not None and count > max_items:
+            count = max_items
+
+        rd_idx = self._rd_idx
+        pos = rd_idx - self._size if rd_idx >= self._size else rd_idx
+        first = self._size - pos
+        if first > count:
+            first = count
+        dest[0:first] = src[pos:pos + first]
+        if count > first:
+            dest[first:count] = src[0:count - first]
+
+        rd_idx += count
+        if rd_idx >= self._wrap:
+            rd_idx -= self._wrap
+        self._rd_idx = rd_idx
+        self._gets += count
+        return count
+
+
+    def put_many (self, items, in_ISR = False):
+        """!
+        Put as many of a batch of items as there is room for into the queue.
+        This must only be called by the producer. It doesn't wait for room.
+        @param items An @c array.array or @c memoryview with the same type
+               code as the queue, or a list or tuple of items
+        @param in_ISR Not needed; accepted for compatibility with @c Queue
+        @return The number of items put into the queue
+        """
+        count = len (items)
+        if count > self._size - self.num_in ():
+            count = self._size - self.num_in ()
+
+        wr_idx = self._wr_idx
+        pos = wr_idx - self._size if wr_idx >= self._size else wr_idx
+        for idx in range (count):
+            self._buffer[pos] = items[idx]
+            pos += 1
+            if pos >= self._size:
+                pos = 0
+
+        wr_idx += count
+        if wr_idx >= self._wrap:
+            wr_idx -= self._wrap
+        self._wr_idx = wr_idx
+        self._puts += count
+        self._rejected += len (items) - count
+
+        num = self.num_in ()
+        if num > self._max_full:
+            self._max_full = num
+
+        # Wake up any tasks waiting for data
+        if count:
+            self._wake ()
+
+        return count
+
+
+    def snapshot (self, in_ISR = False):
+        """!
+        Get views of the queue's contents, oldest first, without copying or
+        removing them. This must only be called by the consumer; see
+        @c Queue.snapshot().
+        @param in_ISR Not needed; accepted for compatibility with @c Queue
+        @return A tuple of two memoryviews holding the queue's contents
+        """
+        rd_idx = self._rd_idx
+        pos = rd_idx - self._size if rd_idx >= self._size else rd_idx
+        return self._views (pos, self.num_in ())
+
+
+    def commit_read (self, count, in_ISR = False):
+        """!
+        Remove items from the front of the queue without reading them. This
+        must only be called by the consumer.
+        @param count The number of items to remove
+        @param in_ISR Not needed; accepted for compatibility with @c Queue
+        @return The number of items removed
+        """
+        num = self.num_in ()
+        if count > num:
+            count = num
+        rd_idx = self._rd_idx + count
+        if rd_idx >= self._wrap:
+            rd_idx -= self._wrap
+        self._rd_idx = rd_idx
+        self._gets += count
+        return count
+
+
+    @micropython.native
+    def any (self):
+        """!
+        Check if there are any items in the queue.
+        @return @c True if items are in the queue, @c False if not
+        """
+        return (self._wr_idx != self._rd_idx)
+
+
+    @micropython.native
+    def empty (self):
+        """!
+        Check if the queue is empty.
+        @return @c True if queue is empty, @c False if it's not empty
+        """
+        return (self._wr_idx == self._rd_idx)
+
+
+    @micropython.native
+    def full (self):
+        """!
+        Check if the queue is full.
+        @return @c True if the queue is full
+        """
+        return (self.num_in () >= self._size)
+
+
+    @micropython.native
+    def num_in (self):
+        """!
+        Check how many items are in the queue, as worked out from the read
+        and write indices.
+        @return The number of items in the queue
+        """
+        num = self._wr_idx - self._rd_idx
+        if num < 0:
+            num += self._wrap
+        return (num)
+
+
+# ============================================================================
+
+class RecordQueue (BaseShare):
+    """!
+    A queue whose items are records of several numbers, such as a time
+    stamp, a position and a duty cycle, packed into one preallocated buffer.
+
+    Each record is described by a tuple of one to four type codes, one for
+    each field, chosen from the same list as for @c Queue; the fields are
+    packed with
+    the @c struct module using standard sizes (so @c 'l' and @c 'I' are
+    32 bits). Putting a record in packs the values straight into the
+    buffer, so everything a control loop iteration produces can be saved
+    with one call, without a queue for each value and without keeping a
+    tuple for each record.
+
+    @code
+    import task_share
+
+    # Records of (microsecond time, signed position, duty cycle)
+    log = task_share.RecordQueue (('I', 'l', 'h'), 1000, name="Log")
+
+    # In a task
+    log.put (utime.ticks_us (), position, duty)
+
+    # Later, read one record
+    t, pos, duty = log.get ()
+    @endcode
+    """
+
+    def __init__ (self, fields, size, thread_protect = False,
+                  overwrite = False, name = None, subscribers = ()):
+        """!
+        Initialize a record queue.
+        @param fields A tuple of one to four type codes, one for each field
+               of a record, such as @c ('I', 'l', 'h')
+        @param size The maximum number of records which the queue can hold
+        @param thread_protect @c True if mutual exclusion protection is used
+        @param overwrite If @c True, the oldest records will be overwritten
+               with new ones if the queue becomes full
+        @param name A short name for the queue, default @c QueueN where @c N
+               is a serial number for the queue
+        @param subscribers Tasks to be woken up when data is put into the
+               queue; see @c subscribe()
+        """
+        if not 1 <= len (fields) <= 4:
+            raise ValueError ('A record must have from 1 to 4 fields')
+
+        super ().__init__ (tuple (fields), thread_protect, name, subscribers)
+        self._num_fields = len (fields)
+
+        ## The @c struct format of one record
+        self.format = '<' + ''.join (fields)
+
+        ## The size of one record in bytes
+        self.record_size = struct.calcsize (self.format)
+
+        self._size = size
+        self._overwrite = overwrite
+        self._name = str (name) if name != None \
+            else 'Queue' + str (Queue.ser_num)
+        Queue.ser_num += 1
+
+        self._buffer = _alloc (self, None, size * self.record_size)
+
+        # Each record is packed here first, so that a value which doesn't
+        # fit its field is caught before anything in the queue is changed
+        self._scratch = bytearray (self.record_size)
+        self.clear ()
+
+        _tidy_heap ()
+
+
+    @micropython.native
+    def _pack (self, buf, offset, v0, v1, v2, v3):
+        """!
+        Pack a record's values into a buffer. The number of values passed
+        to @c struct.pack_into() is fixed for each number of fields, so no
+        tuple of values has to be made.
+        @param buf The buffer into which the record is packed
+        @param offset The place in the buffer where the record starts
+        @param v0 The value of the first field
+        @param v1 The value of the second field, if there is one
+        @param v2 The value of the third field, if there is one
+        @param v3 The value of the fourth field, if there is one
+        """
+        num = self._num_fields
+        if num == 3:
+            struct.pack_into (self.format, buf, offset, v0, v1, v2)
+        elif num == 2:
+            struct.pack_into (self.format, buf, offset, v0, v1)
+        elif num == 4:
+            struct.pack_into (self.format, buf, offset, v0, v1, v2, v3)
+        else:
+            struct.pack_into (self.format, buf, offset, v0)
+
+
+    @micropython.native
+    def put (self, v0, v1 = 0, v2 = 0, v3 = 0, in_ISR = False):
+        """!
+        Put a record into the queue.
+
+        As with @c Queue.put(), this waits for room if the queue is full
+        unless overwriting is allowed, and if called from an ISR gives up
+        rather than waiting. The values are given as separate arguments
+        rather than as a tuple, so that putting a record in doesn't allocate
+        any memory. If a value doesn't fit in its field, an exception is
+        raised and the queue is left as it was.
+        @param v0 The value of the record's first field
+        @param v1 The value of the second field, if there is one
+        @param v2 The value of the third field, if there is one
+        @param v3 The value of the fourth field, if there is one
+        @param in_ISR Set this to @c True if calling from within an ISR
+        """
+        # Check that the values fit before interrupts are turned off
+        self._pack (self._scratch, 0, v0, v1, v2, v3)
+
+        if self.full () and not self._overwrite:
+            if in_ISR:
+                self._rejected += 1
+                return
+            while self.full ():
+                pass
+
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        self._pack (self._buffer, self._wr_idx * self.record_size,
+                    v0, v1, v2, v3)
+        self._puts += 1
+        self._wr_idx += 1
+        if self._wr_idx >= self._size:
+            self._wr_idx = 0
+        self._num_items += 1
+        if self._num_items >= self._size:
+            if self._num_items > self._size:
+                self._rd_idx = self._wr_idx
+                self._overwritten += 1
+            self._num_items = self._size
+        if self._num_items > self._max_full:
+            self._max_full = self._num_items
+
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        # Wake up any tasks waiting for data
+        self._wake ()
+
+
+    def get (self, in_ISR = False):
+        """!
+        Read a record from the queue, waiting until one is available.
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return A tuple holding the values of the oldest record's fields
+        """
+        while self.empty ():
+            pass
+
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        to_return = struct.unpack_from (self.format, self._buffer,
+                                        self._rd_idx * self.record_size)
+        self._rd_idx += 1
+        if self._rd_idx >= self._size:
+            self._rd_idx = 0
+        self._num_items -= 1
+        self._gets += 1
+
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        return (to_return)
+
+
+    def get_many (self, buf, max_items = None, in_ISR = False):
+        """!
+        Copy a batch of records, oldest first, into a @c bytearray or
+        @c memoryview as packed bytes, removing them from the queue. The
+        records can then be sent as they are or taken apart with
+        @c struct.unpack_from() using @c format and @c record_size.
+        @param buf A @c bytearray or @c memoryview into which the records are
+               copied; only whole records are copied
+        @param max_items The most records to read, or @c None to fill @c buf
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The number of records read
+        """
+        dest = memoryview (buf)
+        src = memoryview (self._buffer)
+        rec = self.record_size
+
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        count = self._num_items
+        if count > len (dest) // rec:
+            count = len (dest) // rec
+        if max_items is not None and count > max_items:
+            count = max_items
+
+        rd_idx = self._rd_idx
+        first = self._size - rd_idx
+        if first > count:
+            first = count
+        dest[0:first * rec] = src[rd_idx * rec:(rd_idx + first) * rec]
+        if count > first:
+            dest[first * rec:count * rec] = src[0:(count - first) * rec]
+
+        rd_idx += count
+        if rd_idx >= self._size:
+            rd_idx -= self._size
+        self._rd_idx = rd_idx
+        self._num_items -= count
+        self._gets += count
+
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        return count
+
+
+    def drain_into (self, buf, in_ISR = False):
+        """!
+        Move all the records in the queue, oldest first, into a buffer as
+        packed bytes:
+        @code
+        |   data = log.drain_into (dump_buffer)
+        |   for offset in range (0, len (data), log.record_size):
+        |       print (struct.unpack_from (log.format, data, offset))
+        @endcode
+        @param buf A @c bytearray or @c memoryview at least @c record_size
+               times the size of the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return A memoryview of the part of @c buf which was filled
+        """
+        count = self.get_many (buf, None, in_ISR)
+        return memoryview (buf)[:count * self.record_size]
+
+
+    def any (self):
+        """!
+        Check if there are any records in the queue.
+        @return @c True if records are in the queue, @c False if not
+        """
+        return (self._num_items > 0)
+
+
+    def empty (self):
+        """!
+        Check if the queue is empty.
+        @return @c True if queue is empty, @c False if it's not empty
+        """
+        return (self._num_items <= 0)
+
+
+    def full (self):
+        """!
+        Check if the queue is full.
+        @return @c True if the queue is full
+        """
+        return (self._num_items >= self._size)
+
+
+    def num_in (self):
+        """!
+        Check how many records are in the queue.
+        @return The number of records in the queue
+        """
+        return (self._num_items)
+
+
+    def clear (self):
+        """!
+        Remove all contents from the queue.
+        """
+        self._rd_idx = 0
+        self._wr_idx = 0
+        self._num_items = 0
+        self._max_full = 0
+        self._reset_stats ()
+
+
+    def __repr__ (self):
+        """!
+        This method puts diagnostic information about the queue into a string.
+        """
+        return ('{:<12s} Queue<{:s}> Max Full {:d}/{:d}'.format (self._name,
+                ','.join (type_code_strings[code] for code in self._type_code),
+                self._max_full, self._size) + self._stats_str ())
+
+
+# ============================================================================
+
+class DecimatingQueue (BaseShare):
+    """!
+    A queue for logging a run of any length in a fixed amount of memory.
+
+    The first @c head items put in are kept at full resolution, so the
+    start of a test such as a step response is logged in full. After that,
+    each group of @c factor items (a window) is stored as one entry: the
+    first item of the window, or if @c summary is @c True, the window's
+    minimum, maximum and mean. When the queue fills up, neighboring windows
+    are merged in pairs and @c factor is doubled, so a long soak test never
+    loses its early data; it just loses resolution as it gets longer.
+
+    @code
+    import task_share
+
+    # Keep the first 200 positions, then summaries of 10 or more each
+    log = task_share.DecimatingQueue ('l', 300, factor=10, summary=True,
+                                      head=200, name="Soak")
+
+    # In a task
+    log.put (position)
+
+    # After the run, the first head_num() entries are single items and
+    # each of the rest covers factor() items
+    while log.any ():
+        low, high, mean = log.get ()
+    @endcode
+    """
+
+    def __init__ (self, type_code, size, factor = 1, summary = False,
+                  head = 0, thread_protect = False, name = None,
+                  subscribers = ()):
+        """!
+        Initialize a decimating queue.
+        @param type_code The type of data items put in, as for @c Queue
+        @param size The number of windows which the queue can hold, not
+               counting the items in the head
+        @param factor The number of items in each window at first
+        @param summary If @c True, keep the minimum, maximum and mean of each
+               window; if @c False, keep only the first item of each window
+        @param head The number of items at the start which are kept at full
+               resolution
+        @param thread_protect @c True if mutual exclusion protection is used
+        @param name A short name for the queue, default @c QueueN where @c N
+               is a serial number for the queue
+        @param subscribers Tasks to be woken up when data is put into the
+               queue; see @c subscribe()
+        """
+        super ().__init__ (type_code, thread_protect, name, subscribers)
+
+        self._size = size
+        self._head_size = head
+        self._start_factor = factor if factor > 0 else 1
+        self._summary = summary
+        self._name = str (name) if name != None \
+            else 'Queue' + str (Queue.ser_num)
+        Queue.ser_num += 1
+
+        self._head = _alloc (self, type_code, head)
+        self._buffer = _alloc (self, type_code, size)
+        if summary:
+            self._max = _alloc (self, type_code, size)
+            self._mean = _alloc (self, 'f', size)
+        self.clear ()
+
+        _tidy_heap ()
+
+
+    @micropython.native
+    def put (self, item, in_ISR = False):
+        """!
+        Put an item into the queue. This never waits: when there's no room
+        for another window, the windows already in the queue are merged in
+        pairs to make room. Merging takes time proportional to the size of
+        the queue, but happens only each time the log's length doubles.
+        @param item The item to be put into the queue
+        @param in_ISR Set this to @c True if calling from within an ISR
+        """
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        self._puts += 1
+        if self._head_num < self._head_size:
+            self._head[self._head_num] = item
+            self._head_num += 1
+        else:
+            count = self._acc_count
+            if count == 0:
+                self._acc_first = item
+                self._acc_min = item
+                self._acc_max = item
+                self._acc_sum = item
+            elif self._summary:
+                if item < self._acc_min:
+                    self._acc_min = item
+                if item > self._acc_max:
+                    self._acc_max = item
+                self._acc_sum += item
+            self._acc_count = count + 1
+
+            if self._acc_count >= self._factor:
+                if self._num_items >= self._size:
+                    self._halve ()
+                if self._acc_count >= self._factor:
+                    self._store ()
+
+        if self._head_num + self._num_items > self._max_full:
+            self._max_full = self._head_num + self._num_items
+
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        self._wake ()
+
+
+    def _store (self):
+        """!
+        Move the finished window which has been accumulated into the buffer.
+        """
+        wr_idx = self._wr_idx
+        if self._summary:
+            self._buffer[wr_idx] = self._acc_min
+            self._max[wr_idx] = self._acc_max
+            self._mean[wr_idx] = self._acc_sum / self._acc_count
+        else:
+            self._buffer[wr_idx] = self._acc_first
+        wr_idx += 1
+        if wr_idx >= self._size:
+            wr_idx = 0
+        self._wr_idx = wr_idx
+        self._num_items += 1
+        self._acc_count = 0
+
+
+    def _halve (self):
+        """!
+        Merge the windows in the queue in pairs, oldest first, and double the
+        decimation factor. Merged windows are written from the read pointer
+        onward, which never overtakes the pairs still to be merged. If there
+        is an odd window left over, it's merged into the window being
+        accumulated, which then holds the new factor's worth of items.
+        """
+        size = self._size
+        rd_idx = self._rd_idx
+        pairs = self._num_items // 2
+        buf = self._buffer
+        for k in range (pairs):
+            dst = (rd_idx + k) % size
+            src = (rd_idx + 2 * k) % size
+            nxt = (src + 1) % size
+            if self._summary:
+                if buf[nxt] < buf[src]:
+                    buf[dst] = buf[nxt]
+                else:
+                    buf[dst] = buf[src]
+                if self._max[nxt] > self._max[src]:
+                    self._max[dst] = self._max[nxt]
+                else:
+                    self._max[dst] = self._max[src]
+                self._mean[dst] = (self._mean[src] + self._mean[nxt]) / 2
+            else:
+                buf[dst] = buf[src]
+
+        # Fold an odd window left over into the start of the one in progress
+        if self._num_items & 1:
+            src = (rd_idx + 2 * pairs) % size
+            self._acc_first = buf[src]
+            if self._summary:
+                if buf[src] < self._acc_min:
+                    self._acc_min = buf[src]
+                if self._max[src] > self._acc_max:
+                    self._acc_max = self._max[src]
+                self._acc_sum += self._mean[src] * self._factor
+            self._acc_count += self._factor
+
+        self._num_items = pairs
+        self._wr_idx = (rd_idx + pairs) % size
+        self._factor *= 2
+
+
+    def get (self, in_ISR = False):
+        """!
+        Read the oldest entry from the queue, waiting until one is available.
+        Items from the head are returned just as the windows are, so in
+        summary mode each is returned as a minimum, maximum and mean which
+        are all the same.
+        @param in_ISR Set this to @c True if calling from within an ISR
+        @return The oldest item, or in summary mode a tuple holding the
+                minimum, maximum and mean of the oldest window
+        """
+        while self.empty ():
+            pass
+
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        if self._head_rd < self._head_num:
+            item = self._head[self._head_rd]
+            self._head_rd += 1
+            if self._summary:
+                to_return = (item, item, float (item))
+            else:
+                to_return = item
+        else:
+            rd_idx = self._rd_idx
+            if self._summary:
+                to_return = (self._buffer[rd_idx], self._max[rd_idx],
+                             self._mean[rd_idx])
+            else:
+                to_return = self._buffer[rd_idx]
+            rd_idx += 1
+            if rd_idx >= self._size:
+                rd_idx = 0
+            self._rd_idx = rd_idx
+            self._num_items -= 1
+        self._gets += 1
+
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        return (to_return)
+
+
+    def factor (self):
+        """!
+        Get the number of items which each window in the queue now covers.
+        If the queue is being read while it's written, check this as
+        entries are read, since it doubles each time the queue fills.
+        @return The current decimation factor
+        """
+        return self._factor
+
+
+    def head_num (self):
+        """!
+        Check how many full resolution items from the head are still in the
+        queue; these are read before any windows.
+        @return The number of unread items from the head
+        """
+        return self._head_num - self._head_rd
+
+
+    def any (self):
+        """!
+        Check if there are any entries in the queue.
+        @return @c True if entries are in the queue, @c False if not
+        """
+        return (self._head_rd < self._head_num or self._num_items > 0)
+
+
+    def empty (self):
+        """!
+        Check if the queue is empty.
+        @return @c True if queue is empty, @c False if it's not empty
+        """
+        return not self.any ()
+
+
+    def num_in (self):
+        """!
+        Check how many entries are in the queue. Items which are part of a
+        window that isn't finished yet aren't counted.
+        @return The number of head items plus windows in the queue
+        """
+        return (self._head_num - self._head_rd + self._num_items)
+
+
+    def clear (self):
+        """!
+        Remove all contents from the queue and go back to the decimation
+        factor given when the queue was created.
+        """
+        self._head_num = 0
+        self._head_rd = 0
+        self._rd_idx = 0
+        self._wr_idx = 0
+        self._num_items = 0
+        self._max_full = 0
+        self._factor = self._start_factor
+        self._acc_count = 0
+        self._acc_first = 0
+        self._acc_min = 0
+        self._acc_max = 0
+        self._acc_sum = 0
+        self._reset_stats ()
+
+
+    def __repr__ (self):
+        """!
+        This method puts diagnostic information about the queue into a string.
+        """
+        return ('{:<12s} DecQueue<{:s}> Max Full {:d}/{:d} Factor {:d}'.format (
+                self._name, type_code_strings[self._type_code],
+                self._max_full, self._head_size + self._size, self._factor)
+                + self._stats_str ())
+
+
+# ============================================================================
+
+class BroadcastQueue (BaseShare):
+    """!
+    A queue whose items can be read by several tasks, each of which gets
+    its own copy of every item.
+
+    An ordinary queue has one read pointer, so an item read by one task is
+    gone for the others, and a producer whose data several tasks need has
+    to put it into a queue for each. Here the producer puts each item in
+    once, and each consumer reads through a @c BroadcastReader which keeps
+    its own place in the queue. The producer never waits and never looks at
+    the readers, so adding readers costs it nothing. A reader which falls
+    more than @c size items behind skips to the oldest item still in the
+    queue and counts the items it missed as overruns.
+
+    Neither side disables interrupts: a reader checks after reading each
+    item that the producer didn't overwrite it meanwhile, and reads again
+    if it did. There must be only one producer.
+
+    @code
+    import task_share
+
+    positions = task_share.BroadcastQueue ('l', 100, name="Position")
+    to_host = positions.reader ("Host")
+    to_supervisor = positions.reader ("Super", task=super_task)
+
+    # In the control task
+    positions.put (position)
+
+    # In each consumer task
+    while to_host.any ():
+        send (to_host.get ())
+    @endcode
+    """
+
+    def __init__ (self, type_code, size, name = None, subscribers = ()):
+        """!
+        Initialize a broadcast queue.
+        @param type_code The type of data items which the queue can hold, as
+               for @c Queue
+        @param size The most items which a reader can fall behind before it
+               misses some
+        @param name A short name for the queue, default @c QueueN where @c N
+               is a serial number for the queue
+        @param subscribers Tasks to be woken up when data is put into the
+               queue; see @c subscribe()
+        """
+        super ().__init__ (type_code, False, name, subscribers)
+
+        self._size = size
+        self._name = str (name) if name != None \
+            else 'Queue' + str (Queue.ser_num)
+        Queue.ser_num += 1
+
+        # Sequence numbers wrap at a multiple of the size which fits in a
+        # small integer, so an item's place in the buffer is its sequence
+        # number modulo the size and no long integers are ever created
+        self._period = size * (0x3FFFFFFF // size)
+
+        self._buffer = _alloc (self, type_code, size)
+        self._readers = []
+        self.clear ()
+
+        _tidy_heap ()
+
+
+    @micropython.native
+    def put (self, item, in_ISR = False):
+        """!
+        Put an item into the queue, overwriting the oldest item if the
+        queue is full. This never waits for readers.
+        @param item The item to be put into the queue
+        @param in_ISR Set this to @c True if calling from within an ISR; the
+               queue doesn't need it, but it's accepted for compatibility
+        """
+        seq = self._wr_seq + 1
+        if seq >= self._period:
+            seq = 0
+
+        # Claim the slot first, so a reader can tell that an item it was
+        # reading may have been overwritten, then publish the new item
+        self._claim = seq
+        self._buffer[self._wr_idx] = item
+        wr_idx = self._wr_idx + 1
+        if wr_idx >= self._size:
+            wr_idx = 0
+        self._wr_idx = wr_idx
+        self._wr_seq = seq
+        self._puts += 1
+        if self._puts > self._size:
+            self._overwritten += 1
+
+        self._wake ()
+
+
+    def reader (self, name = None, task = None):
+        """!
+        Create a reader which gets every item put into the queue from now on.
+        @param name A short name for the reader, used in diagnostic printouts
+        @param task A task to be woken up when data is put into the queue, as
+               with @c subscribe()
+        @return A new @c BroadcastReader
+        """
+        new_reader = BroadcastReader (self, name)
+        self._readers.append (new_reader)
+        if task is not None:
+            self.subscribe (task)
+        return new_reader
+
+
+    def remove_reader (self, reader):
+        """!
+        Stop keeping track of a reader which is no longer used.
+        @param reader The reader to be removed
+        """
+        if reader in self._readers:
+            self._readers.remove (reader)
+
+
+    def clear (self):
+        """!
+        Remove all contents from the queue. Readers made earlier will see
+        nothing until new items are put in.
+        """
+        self._wr_idx = 0
+        self._wr_seq = 0
+        self._claim = 0
+        self._max_full = 0
+        for each in self._readers:
+            each._seq = 0
+        self._reset_stats ()
+
+
+    def __repr__ (self):
+        """!
+        This method puts diagnostic information about the queue and its
+        readers into a string.
+        """
+        text = ('{:<12s} Broadcast<{:s}> Max Lag {:d}/{:d}'.format (
+                self._name, type_code_strings[self._type_code],
+                self._max_full, self._size) + self._stats_str ())
+        for each in self._readers:
+            text += '\n  ' + str (each)
+        return text
+
+
+class BroadcastReader:
+    """!
+    One consumer's view of a @c BroadcastQueue. Readers are made by calling
+    the queue's @c reader() method, not by creating them directly.
+    """
+    ## A counter used to give serial numbers to readers for diagnostic use.
+    ser_num = 0
+
+    def __init__ (self, queue, name = None):
+        """!
+        Initialize a reader which starts at the newest end of the queue.
+        @param queue The @c BroadcastQueue to be read
+        @param name A short name for the reader
+        """
+        self._queue = queue
+        self._seq = queue._wr_seq
+        self._gets = 0
+        self._overruns = 0
+        self._name = str (name) if name != None \
+            else 'Reader' + str (BroadcastReader.ser_num)
+        BroadcastReader.ser_num += 1
+
+
+    @micropython.native
+    def _catch_up (self):
+        """!
+        If the producer has overwritten items this reader hadn't read yet,
+        skip to the oldest item which is safe to read and count the rest as
+        missed.
+        @return The sequence number of the next item to be read
+        """
+        queue = self._queue
+        seq = self._seq
+        ahead = queue._claim - seq
+        if ahead < 0:
+            ahead += queue._period
+        if ahead > queue._size:
+            missed = ahead - queue._size
+            self._overruns += missed
+            seq += missed
+            if seq >= queue._period:
+                seq -= queue._period
+            self._seq = seq
+        return seq
+
+
+    @micropython.native
+    def try_get (self, default = None):
+        """!
+        Read the next item if there is one, without waiting.
+        @param default The value to return if there's nothing new to read
+        @return The next item, or @c default if there isn't one
+        """
+        queue = self._queue
+        while True:
+            seq = self._catch_up ()
+            if seq == queue._wr_seq:
+                return default
+
+            item = queue._buffer[seq % queue._size]
+
+            # If the producer claimed this item's slot while it was being
+            # read, it may be garbled; go around and skip past it
+            ahead = queue._claim - seq
+            if ahead < 0:
+                ahead += queue._period
+            if ahead <= queue._size:
+                break
+
+        seq += 1
+        if seq >= queue._period:
+            seq = 0
+        self._seq = seq
+        self._gets += 1
+        queue._gets += 1
+        lag = self.num_in () + 1
+        if lag > queue._max_full:
+            queue._max_full = lag
+        return item
+
+
+    def get (self):
+        """!
+        Read the next item, waiting until one is available. As with
+        @c Queue.get(), this blocks the whole scheduler while it waits, so
+        tasks usually check @c any() first.
+        @return The next item
+        """
+        while True:
+            item = self.try_get (self)
+            if item is not self:
+                return item
+
+
+    def get_many (self, buf, max_items = None):
+        """!
+        Copy a batch of items, oldest first, into an array, removing them
+        from this reader's view of the queue.
+        @param buf An @c array.array or @c memoryview into which the items
+               are copied
+        @param max_items The most items to read, or @c None to fill @c buf
+        @return The number of items read
+        """
+        limit = len (buf)
+        if max_items is not None and max_items < limit:
+            limit = max_items
+        count = 0
+        while count < limit:
+            item = self.try_get (self)
+            if item is self:
+                break
+            buf[count] = item
+            count += 1
+        return count
+
+
+    def any (self):
+        """!
+        Check if there are items this reader hasn't read yet.
+        @return @c True if there are new items, @c False if not
+        """
+        return self._seq != self._queue._wr_seq
+
+
+    def empty (self):
+        """!
+        Check if this reader has read everything in the queue.
+        @return @c True if there's nothing new to read
+        """
+        return self._seq == self._queue._wr_seq
+
+
+    def num_in (self):
+        """!
+        Check how many items this reader can still read. This is at most the
+        size of the queue, even if the reader has fallen further behind.
+        @return The number of unread items
+        """
+        queue = self._queue
+        lag = queue._wr_seq - self._seq
+        if lag < 0:
+            lag += queue._period
+        return lag if lag < queue._size else queue._size
+
+
+    def lag (self):
+        """!
+        Check how far behind the producer this reader is, including any
+        items it has already missed but not yet skipped over.
+        @return The number of items put in which this reader hasn't read
+        """
+        queue = self._queue
+        lag = queue._wr_seq - self._seq
+        if lag < 0:
+            lag += queue._period
+        return lag
+
+
+    def overruns (self):
+        """!
+        Get the number of items this reader has missed because it fell too
+        far behind.
+        @return The number of items missed
+        """
+        return self._overruns
+
+
+    def skip (self):
+        """!
+        Skip past all the items not yet read, so that the next item read is
+        the next one put in.
+        """
+        self._seq = self._queue._wr_seq
+
+
+    def __repr__ (self):
+        """!
+        This method puts diagnostic information about the reader into a
+        string.
+        """
+        return '{:<10s} Lag {:d} Gets {:d} Overruns {:d}'.format (
+            self._name, self.lag (), self._gets, self._overruns)
+
+
+# ============================================================================
+
+class Share (BaseShare):
+    """!
+    An item which holds data to be shared between tasks.
+    This class implements a shared data item which can be protected against
+    data corruption by pre-emptive multithreading. Multithreading which can
+    corrupt shared data includes the use of ordinary interrupts as well as the
+    use of pre-emptive multithreading such as by a Real-Time Operating System
+    (RTOS).
+ 
+    An example of the creation and use of a share is as follows:
+    @code
+    import task_share
+
+    # This share holds a signed short (16-bit) integer
+    my_share = task_share.Queue ('h', name="My Share")
+
+    # Somewhere in one task, put data into the share
+    my_share.put (some_data)
+
+    # In another task, read data from the share
+    something = my_share.get ()
+    @endcode
+    """
+    ## A counter used to give serial numbers to shares for diagnostic use.
+    ser_num = 0
+
+
+    def __init__ (self, type_code, thread_protect = True, name = None,
+                  subscribers = ()):
+        """!
+        Create a shared data item used to transfer data between tasks.
+
+        This method allocates memory in which the shared data will be buffered.
+
+        Each share can only carry data of one particular type which must be
+        chosen from the following list. The data type is specified by a 
+        one-letter type code which is given as for the Python @c array.array
+        type, which can be any of the following:
+        |      |      |      |
+        |:-----|:-----|:-----|
+        | **b** (signed char) | **B** (unsigned char) | 8 bit integers |
+        | **h** (signed short) | **H** (unsigned short) | 16 bit integers |
+        | **i** (signed int) | **I** (unsigned int) | 32 bit integers (probably) |
+        | **l** (signed long) | **L** (unsigned long) | 32 bit integers |
+        | **q** (signed long long) | **Q** (unsigned long long) | 64 bit integers |
+        | **f** (float) | **d** (double-precision float) | |
+
+        @param type_code The type of data items which the share can hold
+        @param thread_protect True if mutual exclusion protection is used
+        @param name A short name for the share, default @c ShareN where @c N
+               is a serial number for the share
+        @param subscribers Tasks to be woken up when data is put into the
+               share; see @c subscribe()
+        """
+        # First call the parent class initializer
+        super ().__init__ (type_code, thread_protect, name, subscribers)
+
+        self._buffer = _alloc (self, type_code, 1)
+
+        self._name = str (name) if name != None \
+            else 'Share' + str (Share.ser_num)
+        Share.ser_num += 1
+
+
+    @micropython.native
+    def put (self, data, in_ISR = False):
+        """!
+        Write an item of data into the share.
+
+        This method puts data into the share; any old data is overwritten.
+        This code disables interrupts during the writing so as to prevent
+        data corrupting by an interrupt service routine which might access
+        the same data.
+        @param data The data to be put into this share
+        @param in_ISR Set this to True if calling from within an ISR
+        """
+
+        # Disable interrupts before writing the data
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        self._buffer[0] = data
+        self._puts += 1
+        self._max_full = 1
+
+        # Re-enable interrupts
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        # Wake up any tasks waiting for data
+        self._wake ()
+
+
+    @micropython.native
+    def get (self, in_ISR = False):
+        """!
+        Read an item of data from the share.
 
         If thread protection is enabled, interrupts are disabled during the time
         that the data is being read so as to prevent data corruption by changes
@@ -432,6 +2276,7 @@ class Share (BaseShare):
             irq_state = pyb.disable_irq ()
 
         to_return = self._buffer[0]
+        self._gets += 1
 
         # Re-enable interrupts
         if self._thread_protect and not in_ISR:
@@ -444,9 +2289,144 @@ class Share (BaseShare):
         """!
         Puts diagnostic information about the share into a string.
 
-        Shares are pretty simple, so we just put the name and type. 
+        Shares are pretty simple, so we just put the name, type and counts.
         """
         return ("{:<12s} Share<{:s}>".format (self._name,
-                type_code_strings[self._type_code]))
+                type_code_strings[self._type_code]) + self._stats_str ())
+
+
+
+
+# ============================================================================
+
+class SeqShare (BaseShare):
+    """!
+    A share which holds a fixed set of values, such as a controller's gain
+    and setpoint, which are always updated together.
+
+    Writing the values one at a time into separate shares lets a reader see
+    a new gain with an old setpoint. This share uses a sequence lock: a
+    version number is made odd while the values are being written and even
+    again when they're done, and a reader which sees the version change while
+    it was reading simply reads again. Readers never disable interrupts.
+
+    Since every write changes the version, a task can cheaply check whether
+    anything has changed since it last read the values and skip the work of
+    reading and applying them when nothing has:
+    @code
+    import task_share
+
+    # Gain (float) and setpoint (signed 32 bit integer)
+    params = task_share.SeqShare (('f', 'l'), name="Params")
+
+    # In one task
+    params.put (0.05, 16000)
+
+    # In another task
+    seen = -1
+    while True:
+        if params.changed (seen):
+            seen = params.version ()
+            kp, setpoint = params.get ()
+        ...
+    @endcode
+    """
+    ## A counter used to give serial numbers to shares for diagnostic use.
+    ser_num = 0
+
+    def __init__ (self, fields, thread_protect = True, name = None,
+                  subscribers = ()):
+        """!
+        Create a share holding a set of values.
+        @param fields A tuple of type codes, one for each value, chosen from
+               the same list as for @c Share
+        @param thread_protect If @c True, interrupts are disabled while the
+               values are written; this is needed if a reader may be an
+               interrupt service routine, which could otherwise interrupt a
+               writer and wait forever for it to finish
+        @param name A short name for the share, default @c SeqShareN where
+               @c N is a serial number for the share
+        @param subscribers Tasks to be woken up when data is put into the
+               share; see @c subscribe()
+        """
+        super ().__init__ (tuple (fields), thread_protect, name, subscribers)
+
+        # One single-item array holds each value
+        self._buffer = [_alloc (self, code, 1) for code in fields]
+        self._version = 0
+
+        self._name = str (name) if name != None \
+            else 'SeqShare' + str (SeqShare.ser_num)
+        SeqShare.ser_num += 1
+
+
+    def put (self, *values, in_ISR = False):
+        """!
+        Write a complete new set of values into the share.
+        @param values The new values, in the order of the share's fields
+        @param in_ISR Set this to True if calling from within an ISR
+        """
+        if self._thread_protect and not in_ISR:
+            irq_state = pyb.disable_irq ()
+
+        # The version is odd while writing; it stays small by wrapping around
+        self._version = (self._version + 1) & 0x3FFFFFFF
+        for idx in range (len (self._buffer)):
+            self._buffer[idx][0] = values[idx]
+        self._version = (self._version + 1) & 0x3FFFFFFF
+        self._puts += 1
+        self._max_full = 1
+
+        if self._thread_protect and not in_ISR:
+            pyb.enable_irq (irq_state)
+
+        # Wake up any tasks waiting for data
+        self._wake ()
+
+
+    def get (self, in_ISR = False):
+        """!
+        Read a consistent set of values from the share, all from the same
+        call to @c put().
+        @param in_ISR Not needed, as readers never disable interrupts;
+               accepted for compatibility with @c Share
+        @return A tuple of the values, in the order of the share's fields
+        """
+        while True:
+            version = self._version
+            if version & 1:
+                continue
+            values = tuple (buf[0] for buf in self._buffer)
+            if self._version == version:
+                self._gets += 1
+                return values
+
+
+    @micropython.native
+    def version (self):
+        """!
+        Get the share's version number, which changes each time new values
+        are put in.
+        @return The version number, an even integer
+        """
+        version = self._version
+        return version & ~1
+
+
+    @micropython.native
+    def changed (self, since):
+        """!
+        Check whether new values have been put in since the given version.
+        @param since A version number returned by @c version()
+        @return @c True if the values may have changed since then
+        """
+        return (self._version != since)
 
 
+    def __repr__ (self):
+        """!
+        Puts diagnostic information about the share into a string.
+        """
+        return ("{:<12s} SeqShare<{:s}> Version {:d}".format (self._name,
+                ','.join (type_code_strings[code] for code in self._type_code),
+                self._version) + self._stats_str ())
@@ -0,0 +1,112 @@
+"""!
+@file test_encoder.py
+Tests the wrap handling of @c EncoderReader and @c EncoderBank on the host
+computer, using the stand-in modules in @c host to play the part of the
+encoder timers' 16-bit counters.
+
+Run it with @c python @c test_encoder.py from @c src, or with @c pytest.
+"""
+import random
+
+import host
+host.install()
+
+import pyb
+from encoder_reader import EncoderReader, EncoderBank, _fold
+
+
+def _make_reader(timer):
+    """!
+    Creates an encoder reader on a fresh simulated timer.
+    @param timer The timer number
+    @return The reader and the timer whose counter it reads
+    """
+    host.reset()
+    return EncoderReader('A', 'B', timer), pyb.Timer(timer)
+
+
+def _folded(position):
+    """!
+    Folds a true position into the range the reader keeps it in.
+    @param position The position as an unbounded integer
+    @return The position as the reader should report it
+    """
+    return ((position + 2**29) & (2**30 - 1)) - 2**29
+
+
+def test_step_over_top():
+    """! Steps from 0xFFFF to 0 count as one step forward """
+    enc, tim = _make_reader(4)
+    tim.counter(0xFFFE)
+    enc.read()
+    enc.zero()
+    for expected in (1, 2, 3):
+        tim.counter((tim.counter() + 1) & 0xFFFF)
+        assert enc.read() == expected
+
+
+def test_step_under_bottom():
+    """! Steps from 0 to 0xFFFF count as one step backward """
+    enc, tim = _make_reader(4)
+    tim.counter(1)
+    enc.read()
+    enc.zero()
+    for expected in (-1, -2, -3):
+        tim.counter((tim.counter() - 1) & 0xFFFF)
+        assert enc.read() == expected
+
+
+def test_random_steps():
+    """! Random steps of up to half a turn either way are all tracked """
+    enc, tim = _make_reader(4)
+    rand = random.Random(1)
+    position = 0
+    raw = tim.counter()
+    for _ in range(20000):
+        step = rand.randint(-32767, 32767)
+        position += step
+        raw = (raw + step) & 0xFFFF
+        tim.counter(raw)
+        assert enc.read() == _folded(position)
+
+
+def test_fold_limits():
+    """! The position wraps between +2**29 - 1 and -2**29 """
+    assert _fold(2**29 - 1, 1) == -2**29
+    assert _fold(-2**29, -1) == 2**29 - 1
+    assert _fold(2**29 - 32768, 32767) == 2**29 - 1
+    assert _fold(-2**29 + 100, -32768) == 2**29 - 32668
+
+
+def test_bank():
+    """! A bank reads all its encoders and keeps the readers up to date """
+    host.reset()
+    first = EncoderReader('A', 'B', 4)
+    second = EncoderReader('C', 'D', 8)
+    bank = EncoderBank((first,))
+    assert bank.add(second) == 1
+
+    timers = (pyb.Timer(4), pyb.Timer(8))
+    rand = random.Random(2)
+    positions = [0, 0]
+    for _ in range(5000):
+        for idx in range(2):
+            step = rand.randint(-32767, 32767)
+            positions[idx] += step
+            timers[idx].counter((timers[idx].counter() + step) & 0xFFFF)
+        host.clock.advance(1000)
+        result = bank.read()
+        assert list(result) == [_folded(pos) for pos in positions]
+        assert [first.count, second.count] == list(result)
+        assert first.timestamp == second.timestamp == bank.timestamp
+
+    bank.zero()
+    assert list(bank.positions) == [0, 0]
+    assert first.read() == 0
+
+
+if __name__ == "__main__":
+    for name, fun in sorted(globals().items()):
+        if name.startswith('test_'):
+            fun()
+            print(name, 'passed')
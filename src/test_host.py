@@ -0,0 +1,69 @@
+"""!
+@file test_host.py
+Tests that the stand-in modules in @c host keep simulated hardware running
+while code busy-waits, and hold timer interrupts pending while interrupts
+are disabled, as a real board would.
+
+Run it with @c python @c test_host.py from @c src, or with @c pytest.
+"""
+import host
+host.install()
+
+import pyb
+import utime
+import task_share
+
+
+def test_callback_during_get_timeout():
+    """! A timer callback feeds a queue while a task polls it """
+    host.reset()
+    queue = task_share.Queue('l', 10, thread_protect=True)
+    timer = pyb.Timer(2, freq=1000)
+    timer.callback(lambda tim: queue.put(utime.ticks_ms(), in_ISR=True))
+
+    start = utime.ticks_ms()
+    item = queue.get_timeout(50, default=None)
+    timer.callback(None)
+
+    assert item is not None
+    assert utime.ticks_diff(utime.ticks_ms(), start) < 5
+
+
+def test_callbacks_while_polling():
+    """! Reading the clock in a loop lets timer callbacks run on time """
+    host.reset()
+    calls = []
+    timer = pyb.Timer(2, freq=1000)
+    timer.callback(lambda tim: calls.append(utime.ticks_us()))
+
+    start = utime.ticks_ms()
+    while utime.ticks_diff(utime.ticks_ms(), start) < 20:
+        pass
+    timer.callback(None)
+
+    assert 19 <= len(calls) <= 21
+
+
+def test_pending_interrupt():
+    """! A timer interrupt which comes due with interrupts off isn't lost """
+    host.reset()
+    calls = []
+    timer = pyb.Timer(2, freq=1000)
+    timer.callback(lambda tim: calls.append(utime.ticks_us()))
+
+    state = pyb.disable_irq()
+    host.clock.advance(5000)
+    assert calls == []
+    pyb.enable_irq(state)
+    assert len(calls) == 1
+
+    host.clock.advance(3000)
+    timer.callback(None)
+    assert len(calls) == 4
+
+
+if __name__ == "__main__":
+    for name, fun in sorted(globals().items()):
+        if name.startswith('test_'):
+            fun()
+            print(name, 'passed')